@@ -0,0 +1,200 @@
+"""
+Per-process admission control for provider calls.
+
+At most ADMISSION_MAX_IN_FLIGHT turns call providers at once; up to
+ADMISSION_MAX_QUEUE more wait for a slot. Both default from the serving
+mode: the thread count of a sync worker, or the ASGI_ADMISSION_* limits
+under asgi.py. A turn is shed straight away when
+the queue is full or when the expected wait (queue position x typical
+provider time / slots) would leave it too little of the Alexa deadline, and
+later if it is still waiting when that time runs out. Shed turns get a
+pre-rendered "busy" reply instead of silence after Alexa's timeout.
+"""
+import os
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional
+
+import metrics
+import provider_scheduler
+from provider_scheduler import Deadline, MIN_PROVIDER_TIME
+
+logger = logging.getLogger(__name__)
+
+# A sync worker runs one turn per thread, so its limits follow the thread count
+# (gunicorn_config.py exports GUNICORN_THREADS): three quarters of the threads
+# may call providers and an eighth more may wait. With 8 threads or more that
+# leaves a thread for turns answered locally, and the queue overflows before
+# every thread is stuck waiting on a provider.
+WORKER_THREADS = int(os.getenv("GUNICORN_THREADS", "1"))
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", str(max(1, WORKER_THREADS * 3 // 4))))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", str(max(1, WORKER_THREADS // 8))))
+# In the ASGI mode waiting turns cost no thread; the bound is the async provider pool
+ASGI_ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ASGI_ADMISSION_MAX_IN_FLIGHT", "200"))
+ASGI_ADMISSION_MAX_QUEUE = int(os.getenv("ASGI_ADMISSION_MAX_QUEUE", "800"))
+# Smoothing of the typical time a turn holds a slot
+ADMISSION_HOLD_EWMA = float(os.getenv("ADMISSION_HOLD_EWMA", "0.1"))
+
+SHED_REASONS = ("queue_full", "deadline", "timeout")
+
+
+class Overloaded(Exception):
+    """Raised when a turn is shed instead of admitted"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Shed provider call: {reason}")
+        self.reason = reason
+
+
+class AdmissionController:
+    """Limit in-flight provider calls with a bounded, deadline-aware wait queue"""
+
+    def __init__(self, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT, max_queue: int = ADMISSION_MAX_QUEUE):
+        self.configure(max_in_flight, max_queue)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = dict.fromkeys(SHED_REASONS, 0)
+        self.avg_hold: Optional[float] = None
+        self._cond = threading.Condition()
+        self._async_cond = None
+
+    def configure(self, max_in_flight: int, max_queue: int) -> None:
+        """Set the limits (the ASGI entry point switches to ASGI_ADMISSION_* at import)"""
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+
+    def _shed_reason(self, deadline: Deadline) -> Optional[str]:
+        """Why a turn that would have to wait should be shed right away (None to let it queue)"""
+        # Waiters already woken for a freed slot are not queued behind anyone
+        if self.waiting - max(0, self.max_in_flight - self.in_flight) >= self.max_queue:
+            return "queue_full"
+        if self.avg_hold is not None:
+            expected_wait = (self.waiting + 1) / self.max_in_flight * self.avg_hold
+            if expected_wait > deadline.remaining() - MIN_PROVIDER_TIME:
+                return "deadline"
+        return None
+
+    def _reject(self, reason: str) -> Overloaded:
+        self.shed[reason] += 1
+        metrics.ADMISSION_SHED.inc(reason)
+        logger.warning("Shedding turn (%s): %d in flight, %d waiting", reason, self.in_flight, self.waiting)
+        return Overloaded(reason)
+
+    def _admitted(self, waited: float) -> None:
+        self.in_flight += 1
+        self.admitted += 1
+        metrics.ADMISSION_WAIT.observe(value=waited)
+
+    def _released(self, hold: float) -> None:
+        self.in_flight -= 1
+        if self.avg_hold is None:
+            self.avg_hold = hold
+        else:
+            self.avg_hold += ADMISSION_HOLD_EWMA * (hold - self.avg_hold)
+
+    def acquire(self, deadline: Deadline) -> None:
+        """
+        Take a slot, waiting in the bounded queue if needed
+
+        Args:
+            deadline: Deadline of the turn
+
+        Raises:
+            Overloaded: the turn was shed
+        """
+        start = time.monotonic()
+        with self._cond:
+            if self.in_flight < self.max_in_flight and self.waiting == 0:
+                self._admitted(0.0)
+                return
+            reason = self._shed_reason(deadline)
+            if reason:
+                raise self._reject(reason)
+            give_up_at = start + deadline.remaining() - MIN_PROVIDER_TIME
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.max_in_flight:
+                    remaining = give_up_at - time.monotonic()
+                    if remaining <= 0:
+                        raise self._reject("timeout")
+                    self._cond.wait(remaining)
+                self._admitted(time.monotonic() - start)
+            finally:
+                self.waiting -= 1
+
+    def release(self, hold: float) -> None:
+        with self._cond:
+            self._released(hold)
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, deadline: Deadline):
+        """Hold a slot for the duration of the block (raises Overloaded when shed)"""
+        with metrics.stage_timer("admission"):
+            self.acquire(deadline)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    async def acquire_async(self, deadline: Deadline) -> None:
+        """Asyncio counterpart of acquire for the ASGI serving mode"""
+        import asyncio  # deferred: sync workers never load it
+
+        if self._async_cond is None:
+            self._async_cond = asyncio.Condition()
+        start = time.monotonic()
+        async with self._async_cond:
+            if self.in_flight < self.max_in_flight and self.waiting == 0:
+                self._admitted(0.0)
+                return
+            reason = self._shed_reason(deadline)
+            if reason:
+                raise self._reject(reason)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(
+                    self._async_cond.wait_for(lambda: self.in_flight < self.max_in_flight),
+                    max(0.0, deadline.remaining() - MIN_PROVIDER_TIME),
+                )
+                self._admitted(time.monotonic() - start)
+            except asyncio.TimeoutError:
+                raise self._reject("timeout")
+            finally:
+                self.waiting -= 1
+
+    async def release_async(self, hold: float) -> None:
+        async with self._async_cond:
+            self._released(hold)
+            self._async_cond.notify()
+
+    @asynccontextmanager
+    async def slot_async(self, deadline: Deadline):
+        """Asyncio counterpart of slot"""
+        with metrics.stage_timer("admission"):
+            await self.acquire_async(deadline)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            await self.release_async(time.monotonic() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            # Losing hedged calls still running for turns that have already answered
+            "lingering_calls": provider_scheduler.lingering_calls(),
+            "avg_hold_ms": round(self.avg_hold * 1000, 1) if self.avg_hold is not None else None,
+        }
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,180 @@
+"""
+Alexa request parsing and response rendering.
+
+Requests are decoded straight from the body (with orjson when it is
+installed) and validated in one pass into an AlexaRequest, instead of
+chained .get() lookups spread over the webhook and the dispatcher.
+
+Responses are rendered from a fixed envelope: the JSON around text,
+language and shouldEndSession never changes, so it is kept as pre-encoded
+bytes and only those three values are encoded per reply. Replies whose
+text is a constant (error messages, built-in and canned intent replies)
+are rendered once at start-up and served as bytes. The output is byte for
+byte what Flask's jsonify produced for the equivalent dict.
+"""
+import json
+import logging
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+# Optional: a faster decoder for request bodies; the standard library is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# (speech text or None for an empty response, language, shouldEndSession)
+AlexaReply = Tuple[Optional[str], str, bool]
+
+# Slots checked first for the user's utterance, before any other filled slot
+QUERY_SLOTS = ("query", "message")
+
+# The C string encoder jsonify uses (ASCII-only output, non-ASCII escaped)
+_encode_string = json.encoder.encode_basestring_ascii
+
+# Keys in jsonify's sorted order: response{outputSpeech{text,type},shouldEndSession},sessionAttributes{language},version
+_ENVELOPE_HEAD = b'{"response":{"outputSpeech":{"text":'
+_ENVELOPE_SPEECH_END = b',"type":"PlainText"},"shouldEndSession":'
+_ENVELOPE_LANGUAGE = b'},"sessionAttributes":{"language":'
+_ENVELOPE_TAIL = b'},"version":"1.0"}\n'
+_END_SESSION = {True: b"true", False: b"false"}
+EMPTY_RESPONSE = b'{"response":{},"version":"1.0"}\n'
+
+# (text, language, end_session) -> rendered bytes for replies known at start-up
+CONSTANT_REPLIES: Dict[Tuple[Optional[str], str, bool], bytes] = {}
+
+
+class InvalidRequest(ValueError):
+    """Raised when a request body is not a well-formed Alexa request envelope"""
+
+
+class AlexaRequest(NamedTuple):
+    """The fields of an Alexa request envelope this skill uses"""
+    request_type: str
+    session_id: str
+    locale: str
+    intent_name: Optional[str]
+    user_query: Optional[str]
+    reason: Optional[str]
+    error: Optional[Any]
+
+
+def loads(body: bytes) -> Dict[str, Any]:
+    """
+    Decode a request body
+
+    Raises:
+        InvalidRequest: the body is not a JSON object
+    """
+    try:
+        payload = orjson.loads(body) if orjson is not None else json.loads(body)
+    except ValueError as e:
+        raise InvalidRequest(f"Request body is not valid JSON: {e}") from None
+    if not isinstance(payload, dict):
+        raise InvalidRequest("Request body is not a JSON object")
+    return payload
+
+
+def _section(container: Dict[str, Any], key: str) -> Dict[str, Any]:
+    value = container.get(key)
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise InvalidRequest(f"'{key}' must be an object")
+    return value
+
+
+def _slot_value(slots: Dict[str, Any]) -> Optional[str]:
+    for name in QUERY_SLOTS:
+        slot = slots.get(name)
+        if isinstance(slot, dict) and slot.get("value"):
+            return slot["value"]
+    for slot in slots.values():
+        if isinstance(slot, dict) and slot.get("value"):
+            return slot["value"]
+    return None
+
+
+def parse_request(payload: Dict[str, Any]) -> AlexaRequest:
+    """
+    Validate an Alexa request envelope and pull out the fields used per turn
+
+    Missing sections fall back to the defaults the webhook has always used
+    (session "default", locale en-US, an IntentRequest).
+
+    Args:
+        payload: Decoded request JSON
+
+    Returns:
+        AlexaRequest
+
+    Raises:
+        InvalidRequest: a section has the wrong type
+    """
+    if not isinstance(payload, dict):
+        raise InvalidRequest("Request body is not a JSON object")
+    request_data = _section(payload, "request")
+    intent = _section(request_data, "intent")
+    request_type = request_data.get("type") or "IntentRequest"
+    locale = request_data.get("locale") or "en-US"
+    session_id = _section(payload, "session").get("sessionId") or "default"
+    if not isinstance(request_type, str) or not isinstance(locale, str) or not isinstance(session_id, str):
+        raise InvalidRequest("'type', 'locale' and 'sessionId' must be strings")
+    user_query = _slot_value(_section(intent, "slots")) if request_type == "IntentRequest" else None
+    if user_query is not None and not isinstance(user_query, str):
+        raise InvalidRequest("Slot values must be strings")
+    return AlexaRequest(
+        request_type=request_type,
+        session_id=session_id,
+        locale=locale,
+        intent_name=intent.get("name"),
+        user_query=user_query,
+        reason=request_data.get("reason"),
+        error=request_data.get("error"),
+    )
+
+
+def render_response(text: Optional[str], language: str = "en", end_session: bool = True) -> bytes:
+    """
+    Render a reply into the Alexa response envelope
+
+    Args:
+        text: Speech text (None gives an empty response)
+        language: Language code stored in the session attributes
+        end_session: Whether Alexa should close the session
+
+    Returns:
+        The response body
+    """
+    if text is None:
+        return EMPTY_RESPONSE
+    return b"".join((
+        _ENVELOPE_HEAD, _encode_string(text).encode("ascii"),
+        _ENVELOPE_SPEECH_END, _END_SESSION[bool(end_session)],
+        _ENVELOPE_LANGUAGE, _encode_string(language).encode("ascii"),
+        _ENVELOPE_TAIL,
+    ))
+
+
+def encode_alexa_response(text: Optional[str], language: str = "en", end_session: bool = True) -> bytes:
+    """Response body for a reply, served pre-rendered when the reply is a known constant"""
+    rendered = CONSTANT_REPLIES.get((text, language, end_session))
+    if rendered is None:
+        rendered = render_response(text, language, end_session)
+    return rendered
+
+
+def prerender(replies: Iterable[AlexaReply]) -> int:
+    """
+    Render constant replies once so they are served as bytes
+
+    Args:
+        replies: (text, language, end_session) tuples
+
+    Returns:
+        Number of distinct replies now pre-rendered
+    """
+    for text, language, end_session in replies:
+        CONSTANT_REPLIES[(text, language, end_session)] = render_response(text, language, end_session)
+    return len(CONSTANT_REPLIES)
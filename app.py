@@ -1,12 +1,34 @@
 import os
+import json
 import logging
-import requests
-from flask import Flask, request, jsonify, render_template
+from functools import partial
+from flask import Flask, request, jsonify, render_template, Response, g
 from flask_cors import CORS
-from language_utils import detect_language, get_system_prompt, get_error_messages
+from language_utils import detect_language, get_error_messages, VoiceStreamAccumulator, ERROR_MESSAGES
+from context_builder import build_context, as_chat_messages, estimate_tokens, CONTEXT_TOKEN_BUDGETS
+import metrics
+from logging_setup import configure_logging, redact_payload, SAMPLED
+import provider_client
+import provider_scheduler
+import startup
+from admission import admission_controller, Overloaded
+from local_inference import local_model
+from provider_registry import registry as provider_registry, parse_endpoints
+from request_coalescing import SingleFlight, MicroBatcher, HF_COALESCE_ENABLED, HF_BATCH_ENABLED
+from response_cache import response_cache, make_key as make_cache_key
+from session_store import session_store
+from intent_index import intent_index, DEFAULT_RESPONSES
+from request_dispatcher import dispatch as dispatch_request_type, BUILTIN_REPLIES, SESSION_ENDED_REPLY
+from alexa_format import (
+    InvalidRequest,
+    encode_alexa_response,
+    loads as parse_body,
+    parse_request as parse_alexa_request,
+    prerender as prerender_replies,
+)
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (non-blocking, structured, sampled; see logging_setup.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -17,302 +39,552 @@ app.secret_key = os.environ.get("SESSION_SECRET", "alexa-multilingual-skill-secr
 HF_TOKEN = os.getenv("HF_TOKEN") # SECURITY: no hardcoding
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-# API endpoints
-HF_API_URL = "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.3"
-OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+# API endpoints (overridable, e.g. to point at a local mock provider)
+HF_API_URL = os.getenv("HF_API_URL", "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.3")
+OPENAI_API_URL = os.getenv("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions")
 
-def query_openai_api(messages):
-    """Query OpenAI API for chat completions using messages array"""
-    if not OPENAI_API_KEY:
-        return None
-    
+# Stream OpenAI completions and stop reading once the spoken reply is long enough
+OPENAI_STREAM = os.getenv("OPENAI_STREAM", "false").lower() == "true"
+
+# Provider endpoints in priority order, each with its own pool and circuit breaker.
+# OPENAI_ENDPOINTS / HF_ENDPOINTS list several URL|KEY|WEIGHT entries (see provider_registry.py)
+provider_registry.register("openai", parse_endpoints(os.getenv("OPENAI_ENDPOINTS"), OPENAI_API_URL, OPENAI_API_KEY))
+provider_registry.register("huggingface", parse_endpoints(os.getenv("HF_ENDPOINTS"), HF_API_URL, HF_TOKEN))
+# Every admitted turn may run its whole chain at once, and the losers of its previous
+# turn may still be running: two chains' worth of threads per slot keeps losing calls
+# from leaving a new turn's calls queued for a thread
+SCHEDULER_POOL_SIZE = provider_scheduler.configure_executor(
+    2 * admission_controller.max_in_flight * max(1, len(provider_registry.endpoints()))
+)
+
+def build_openai_request(messages, api_key=None):
+    """Build OpenAI chat-completions headers and payload for a messages array"""
     headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Authorization": f"Bearer {api_key or OPENAI_API_KEY}",
         "Content-Type": "application/json"
     }
     
     payload = {
         "model": "gpt-3.5-turbo",
-        "messages": messages,
-														 
-											   
-		  
+        "messages": as_chat_messages(messages).fit(CONTEXT_TOKEN_BUDGETS["openai"]),
         "max_tokens": 150,
         "temperature": 0.7
     }
+    return headers, payload
+
+def parse_openai_response(result):
+    """Extract the assistant reply from an OpenAI chat-completions result"""
+    return result["choices"][0]["message"]["content"].strip()
+
+def query_openai_api(messages, timeout=30, endpoint=None):
+    """Query OpenAI API for chat completions using messages array"""
+    endpoint = endpoint or provider_registry.primary("openai")
+    if endpoint is None:
+        return None
+    
+    headers, payload = build_openai_request(messages, endpoint.api_key)
+    
+    try:
+        response = endpoint.client.post(endpoint.url, headers=headers, json=payload, timeout=timeout)
+        if response.status_code == 200:
+            return parse_openai_response(response.json())
+        else:
+            logger.error("OpenAI API error: %s - %s", response.status_code, response.text)
+        return None
+    except Exception as e:
+        logger.error("Error calling OpenAI API: %s", e)
+        return None
+
+async def query_openai_api_async(messages, timeout=30, endpoint=None):
+    """Non-blocking variant of query_openai_api for the ASGI serving mode"""
+    endpoint = endpoint or provider_registry.primary("openai")
+    if endpoint is None:
+        return None
+    
+    headers, payload = build_openai_request(messages, endpoint.api_key)
     
     try:
-        response = requests.post(OPENAI_API_URL, headers=headers, json=payload, timeout=30)
+        response = await endpoint.async_client.post(endpoint.url, headers=headers, json=payload, timeout=timeout)
         if response.status_code == 200:
-            result = response.json()
-            return result["choices"][0]["message"]["content"].strip()
+            return parse_openai_response(response.json())
         else:
-            logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
+            logger.error("OpenAI API error: %s - %s", response.status_code, response.text)
         return None
     except Exception as e:
-        logger.error(f"Error calling OpenAI API: {e}")
+        logger.error("Error calling OpenAI API: %s", e)
         return None
 
-def query_huggingface_api(messages):
-    if not HF_TOKEN:
+def parse_openai_stream_line(line):
+    """Extract the content delta from one OpenAI SSE line ('' for keep-alives, None at [DONE])"""
+    if not line.startswith("data:"):
+        return ""
+    data = line[5:].strip()
+    if data == "[DONE]":
         return None
+    choices = json.loads(data).get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or ""
 
-    # Build the prompt as before:
-    prompt = ""
-    if messages and messages[0].get("role") == "system":
-        prompt += messages[0]["content"].strip() + "\n"
-    user_turns = messages[1:] if messages and messages[0].get("role") == "system" else messages
-    for m in user_turns:
-        if m["role"] == "user":
-            prompt += f"User: {m['content'].strip()}\n"
-        elif m["role"] == "assistant":
-            prompt += f"Assistant: {m['content'].strip()}\n"
-    prompt += "Assistant:"
+def query_openai_api_stream(messages, timeout=30, language="en", endpoint=None):
+    """Stream an OpenAI completion, closing the stream once the voice length limit is reached"""
+    endpoint = endpoint or provider_registry.primary("openai")
+    if endpoint is None:
+        return None
+    
+    headers, payload = build_openai_request(messages, endpoint.api_key)
+    payload["stream"] = True
+    accumulator = VoiceStreamAccumulator(language)
+    
+    try:
+        response = endpoint.client.post(endpoint.url, headers=headers, json=payload, timeout=timeout, stream=True)
+        try:
+            if response.status_code != 200:
+                logger.error("OpenAI API error: %s - %s", response.status_code, response.text)
+                return None
+            for raw_line in response.iter_lines(chunk_size=None):
+                if provider_scheduler.call_cancelled():
+                    # Another provider already answered this turn (or its deadline passed)
+                    return None
+                delta = parse_openai_stream_line(raw_line.decode("utf-8"))
+                if delta is None or accumulator.feed(delta):
+                    break
+        finally:
+            # Closing early drops the connection, which stops generation upstream
+            response.close()
+        return accumulator.text() or None
+    except Exception as e:
+        logger.error("Error streaming from OpenAI API: %s", e)
+        return None
 
-    headers = {
-        "Authorization": f"Bearer {HF_TOKEN}",
+async def query_openai_api_stream_async(messages, timeout=30, language="en", endpoint=None):
+    """Non-blocking variant of query_openai_api_stream for the ASGI serving mode"""
+    endpoint = endpoint or provider_registry.primary("openai")
+    if endpoint is None:
+        return None
+    
+    headers, payload = build_openai_request(messages, endpoint.api_key)
+    payload["stream"] = True
+    accumulator = VoiceStreamAccumulator(language)
+    
+    try:
+        client = endpoint.async_client
+        async with client.stream(endpoint.url, headers=headers, json=payload, timeout=timeout) as response:
+            if response.status_code != 200:
+                await response.aread()
+                logger.error("OpenAI API error: %s - %s", response.status_code, response.text)
+                return None
+            async for line in response.aiter_lines():
+                delta = parse_openai_stream_line(line)
+                if delta is None or accumulator.feed(delta):
+                    break
+        return accumulator.text() or None
+    except Exception as e:
+        logger.error("Error streaming from OpenAI API: %s", e)
+        return None
+
+def build_huggingface_headers(api_key=None):
+    """Authorization headers for the HuggingFace Inference API"""
+    return {
+        "Authorization": f"Bearer {api_key or HF_TOKEN}",
         "Content-Type": "application/json"
     }
+
+def build_huggingface_request(messages, api_key=None):
+    """Build HuggingFace text-generation headers and payload from a messages array"""
+    # Joined from per-message segments rendered when the context was built
+    prompt = as_chat_messages(messages).fit(CONTEXT_TOKEN_BUDGETS["huggingface"]).hf_prompt()
+
     payload = {"inputs": prompt}
+    return build_huggingface_headers(api_key), payload
+
+def parse_huggingface_response(result):
+    """Extract the first assistant reply from a HuggingFace text-generation result"""
+    if isinstance(result, list) and len(result) > 0:
+        generated_text = result[0].get("generated_text", "").strip()
+        # Extract only the FIRST assistant reply after the input prompt.
+        if "Assistant:" in generated_text:
+            answer_part = generated_text.split("Assistant:", 1)[1]
+            # If the model continues with any new "User:"/question, truncate at that point.
+            answer_lines = answer_part.split("User:", 1)[0]
+            # Optionally just take the first sentence for even shorter Alexa reply
+            answer_lines = answer_lines.strip()
+            # If there's nothing, fall back to all generated_text (safety)
+            if answer_lines:
+                return answer_lines
+        return generated_text
+    return None
+
+# Concurrent identical prompts share one call; with HF_BATCH_ENABLED prompts are also micro-batched
+hf_single_flight = SingleFlight("huggingface")
+hf_batchers = {}
+
+def get_hf_batcher(endpoint):
+    """Micro-batcher for one HuggingFace endpoint"""
+    batcher = hf_batchers.get(endpoint.name)
+    if batcher is None:
+        batcher = hf_batchers.setdefault(endpoint.name, MicroBatcher(endpoint.name, partial(send_huggingface_batch, endpoint)))
+    return batcher
+
+def send_huggingface_batch(endpoint, prompts, timeout):
+    """Send several prompts as one batched `inputs` list; returns one reply (or None) per prompt"""
+    response = endpoint.client.post(
+        endpoint.url, headers=build_huggingface_headers(endpoint.api_key), json={"inputs": prompts}, timeout=timeout
+    )
+    if response.status_code != 200:
+        logger.error("HuggingFace API error: %s - %s", response.status_code, response.text)
+        return [None] * len(prompts)
+    # Each entry is either one generation or a list of generations for that input
+    return [parse_huggingface_response(item if isinstance(item, list) else [item]) for item in response.json()]
+
+def send_huggingface_prompt(endpoint, headers, payload, timeout):
+    """Send one prompt, through the endpoint's micro-batcher when batching is enabled"""
+    if HF_BATCH_ENABLED:
+        return get_hf_batcher(endpoint).call(payload["inputs"], timeout)
     try:
-        response = requests.post(HF_API_URL, headers=headers, json=payload, timeout=30)
+        response = endpoint.client.post(endpoint.url, headers=headers, json=payload, timeout=timeout)
         if response.status_code == 200:
-            result = response.json()
-            if isinstance(result, list) and len(result) > 0:
-                generated_text = result[0].get("generated_text", "").strip()
-                # Extract only the FIRST assistant reply after the input prompt.
-                if "Assistant:" in generated_text:
-                    answer_part = generated_text.split("Assistant:", 1)[1]
-                    # If the model continues with any new "User:"/question, truncate at that point.
-                    answer_lines = answer_part.split("User:", 1)[0]
-                    # Optionally just take the first sentence for even shorter Alexa reply
-                    answer_lines = answer_lines.strip()
-                    # If there's nothing, fall back to all generated_text (safety)
-                    if answer_lines:
-                        return answer_lines
-                return generated_text
+            return parse_huggingface_response(response.json())
         else:
-            logger.error(f"HuggingFace API error: {response.status_code} - {response.text}")
+            logger.error("HuggingFace API error: %s - %s", response.status_code, response.text)
         return None
     except Exception as e:
-        logger.error(f"Error calling HuggingFace API: {e}")
+        logger.error("Error calling HuggingFace API: %s", e)
         return None
 
+async def send_huggingface_prompt_async(endpoint, headers, payload, timeout):
+    """Non-blocking variant of send_huggingface_prompt for the ASGI serving mode"""
+    if HF_BATCH_ENABLED:
+        return await get_hf_batcher(endpoint).call_async(payload["inputs"], timeout)
+    try:
+        response = await endpoint.async_client.post(endpoint.url, headers=headers, json=payload, timeout=timeout)
+        if response.status_code == 200:
+            return parse_huggingface_response(response.json())
+        else:
+            logger.error("HuggingFace API error: %s - %s", response.status_code, response.text)
+        return None
+    except Exception as e:
+        logger.error("Error calling HuggingFace API: %s", e)
+        return None
+
+def query_huggingface_api(messages, timeout=30, endpoint=None):
+    endpoint = endpoint or provider_registry.primary("huggingface")
+    if endpoint is None:
+        return None
+
+    headers, payload = build_huggingface_request(messages, endpoint.api_key)
+    send = partial(send_huggingface_prompt, endpoint, headers, payload, timeout)
+    if HF_COALESCE_ENABLED:
+        return hf_single_flight.do((endpoint.name, payload["inputs"]), send, timeout)
+    return send()
+
+async def query_huggingface_api_async(messages, timeout=30, endpoint=None):
+    """Non-blocking variant of query_huggingface_api for the ASGI serving mode"""
+    endpoint = endpoint or provider_registry.primary("huggingface")
+    if endpoint is None:
+        return None
+
+    headers, payload = build_huggingface_request(messages, endpoint.api_key)
+    send = partial(send_huggingface_prompt_async, endpoint, headers, payload, timeout)
+    if HF_COALESCE_ENABLED:
+        return await hf_single_flight.do_async((endpoint.name, payload["inputs"]), send, timeout)
+    return await send()
+
 def get_fallback_response(user_query, language):
     """Generate fallback responses when APIs are unavailable"""
-    prompt_lower = user_query.lower()
-    
-    if language == "hi":
-        responses = {
-            "hello": "नमस्ते! मैं आपकी सहायता के लिए यहाँ हूँ।",
-            "how are you": "मैं ठीक हूँ, धन्यवाद! आपका दिन कैसा है?",
-            "weather": "मुझे मौसम की जानकारी नहीं है, लेकिन मैं अन्य सवालों में मदद कर सकता हूँ।",
-            "time": "मुझे वर्तमान समय नहीं पता, लेकिन मैं अन्य प्रश्नों का उत्तर दे सकता हूँ।",
-            "name": "मैं एक AI सहायक हूँ जो हिंदी और अंग्रेजी में बात कर सकता हूँ।",
-            "help": "मैं सवालों के जवाब दे सकता हूँ और बातचीत कर सकता हूँ। कुछ और पूछिए!"
-        }
-        default = "यह दिलचस्प सवाल है। मैं इसके बारे मे��� और जानना चाहूँगा। क्या आप कुछ और बता सकते हैं?"
+    return intent_index.fallback(user_query, language)
+
+def get_provider_chain(async_mode=False, language="en"):
+    """Healthy provider endpoints, best first, as (name, fn) pairs for the scheduler"""
+    if OPENAI_STREAM:
+        stream_fn = query_openai_api_stream_async if async_mode else query_openai_api_stream
+        openai_fn = partial(stream_fn, language=language)
     else:
-        responses = {
-            "hello": "Hello! I'm here to help you.",
-            "how are you": "I'm doing well, thank you! How is your day going?",
-            "weather": "I don't have access to weather information, but I can help with other questions.",
-            "time": "I don't know the current time, but I can answer other questions.",
-            "name": "I'm an AI assistant that can communicate in both Hindi and English.",
-            "help": "I can answer questions and have conversations. What would you like to know?"
-        }
-        default = "That's an interesting question. I'd like to learn more about that. Can you tell me more?"
-    
-    for key, response in responses.items():
-        if key in prompt_lower:
-            return response
-	
-    return default
-
-def query_ai_api(messages, user_query, detected_language="en"):
-    """Try OpenAI first, fallback to HuggingFace, then local fallback, using message history array"""
-    # Try OpenAI first
-    result = query_openai_api(messages)
+        openai_fn = query_openai_api_async if async_mode else query_openai_api
+    query_fns = {
+        "openai": openai_fn,
+        "huggingface": query_huggingface_api_async if async_mode else query_huggingface_api,
+    }
+    return provider_registry.chain(query_fns, async_mode=async_mode)
+
+def query_ai_api(messages, user_query, detected_language="en", deadline=None):
+    """Race the healthiest provider endpoints (hedged) within the Alexa deadline, then the on-box model, then canned replies"""
+    if deadline is None:
+        deadline = provider_scheduler.Deadline()
+
+    # Repeated questions with the same recent history are answered from cache
+    cache_key = make_cache_key(detected_language, user_query, messages)
+    cached = response_cache.get(cache_key)
+    if cached:
+        return cached
+
+    # OpenAI is primary unless its circuits are open; the next endpoint is started as a hedge.
+    # Raises Overloaded when too many turns are already waiting on providers.
+    with admission_controller.slot(deadline), metrics.stage_timer("providers"):
+        result = provider_scheduler.race_providers(get_provider_chain(language=detected_language), messages, deadline)
     if result:
+        response_cache.put(cache_key, result)
         return result
     
-    # Fallback to HuggingFace
-    result = query_huggingface_api(messages)
+    # Remote providers failed or are unavailable: on-box model, when one is loaded (not cached)
+    local_reply = local_model.generate(messages, detected_language, deadline)
+    if local_reply:
+        return local_reply
+    
+    # Final fallback - always return something
+    return get_fallback_response(user_query, detected_language)
+
+async def query_ai_api_async(messages, user_query, detected_language="en", deadline=None):
+    """Non-blocking variant of query_ai_api; losing provider calls are truly cancelled"""
+    if deadline is None:
+        deadline = provider_scheduler.Deadline()
+
+    cache_key = make_cache_key(detected_language, user_query, messages)
+    cached = response_cache.get(cache_key)
+    if cached:
+        return cached
+
+    async with admission_controller.slot_async(deadline):
+        with metrics.stage_timer("providers"):
+            result = await provider_scheduler.race_providers_async(
+                get_provider_chain(async_mode=True, language=detected_language), messages, deadline
+            )
     if result:
+        response_cache.put(cache_key, result)
         return result
     
-    # Final fallback - always return something
+    local_reply = await local_model.generate_async(messages, detected_language, deadline)
+    if local_reply:
+        return local_reply
+    
     return get_fallback_response(user_query, detected_language)
 
-def build_chat_messages_from_history(history, user_query, system_prompt=None):
+def build_chat_messages_from_history(history, user_query, language="en", query_tokens=None):
     """
     Convert chat history and user's current Alexa question into chat-completions 'messages' format.
-    Optionally prepend a system prompt (for models like OpenAI/Mistral).
-	
-																 
-											  
-																  
-	
-																					  
+    The language's system prompt comes first, then as many recent turns as fit the
+    token budget (see context_builder.py), then the question.
     """
-    messages = []
-    if system_prompt:
-        messages.append({"role": "system", "content": system_prompt})
-
-    # Add previous turns as user/assistant pairs
-    for turn in history:
-        if turn.get("user"):
-            messages.append({"role": "user", "content": turn["user"]})
-        if turn.get("assistant"):
-            messages.append({"role": "assistant", "content": turn["assistant"]})
-
-    # Add the latest user turn
-    messages.append({"role": "user", "content": user_query})
-    return messages
-
-# In-memory history storage per Alexa session with language context
-chat_history = {}
+    return build_context(history, user_query, language, query_tokens=query_tokens)
 
 @app.route("/", methods=["GET"])
 def index():
     """Home page to display application status"""
     return render_template("index.html")
 
+def prepare_alexa_turn(payload):
+    """
+    Parse an Alexa payload and prepare the provider call for this turn.
+
+    Shared by the sync Flask view and the async ASGI handler. Returns a
+    (turn, reply) pair: reply is a (text, language, end_session) tuple when the turn can
+    be answered without calling a provider, otherwise turn holds the
+    session, language and chat-completions messages for query_ai_api.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Received Alexa payload: %s", redact_payload(payload), extra=SAMPLED)
+    
+    # One validating pass over the envelope (raises InvalidRequest)
+    alexa_request = parse_alexa_request(payload)
+    
+    # Launch, session-ended and built-in intents have prebuilt replies
+    builtin_reply = dispatch_request_type(alexa_request)
+    if builtin_reply is not None:
+        return None, builtin_reply
+    
+    session_id = alexa_request.session_id
+    user_query = alexa_request.user_query
+    request_locale = alexa_request.locale
+    
+    if not user_query:
+        logger.error("No user query found in request")
+        # Keep the session open so the user can simply ask again
+        language = detect_language("", request_locale)
+        return None, (get_error_messages(language)["no_query"], language, False)
+    
+    with metrics.stage_timer("detect_language"):
+        detected_language = detect_language(user_query, request_locale)
+    
+    logger.info("Session: %s, Language: %s, Query: %s", session_id, detected_language, user_query,
+                extra=SAMPLED)
+    
+    # Known intents (greetings, help, name...) are answered locally without a provider call
+    local_reply = intent_index.answer(user_query, detected_language)
+    
+    # Check if any AI API token (or the on-box model) is available
+    if local_reply is None and not provider_registry.configured() and not local_model.enabled:
+        error_messages = get_error_messages(detected_language)
+        return None, (error_messages["service_unavailable"], detected_language)
+    
+    # Get session history with language context (shared across workers)
+    session_data = session_store.get(session_id) or {
+        "messages": [],
+        "primary_language": detected_language
+    }
+    
+    # Update primary language if consistently using a different language
+    if detected_language != session_data["primary_language"]:
+        session_data["primary_language"] = detected_language
+        logger.info("Updated primary language for session %s to %s", session_id, detected_language)
+    
+    turn = {
+        "session_id": session_id,
+        "session_data": session_data,
+        "user_query": user_query,
+        "query_tokens": estimate_tokens(user_query),
+        "language": detected_language
+    }
+    if local_reply is not None:
+        return None, complete_alexa_turn(turn, local_reply)
+    
+    # Build chat-completions messages from as much recent history as fits the token budget
+    history = session_data["messages"]
+    with metrics.stage_timer("build_messages"):
+        turn["messages"] = build_chat_messages_from_history(history, user_query, detected_language, turn["query_tokens"])
+    return turn, None
+
+def complete_alexa_turn(turn, ai_reply):
+    """Clean up the provider reply, record it in session history and return (text, language, end_session)"""
+    detected_language = turn["language"]
+    if ai_reply is None:
+        error_messages = get_error_messages(detected_language)
+        return error_messages["service_unavailable"], detected_language
+    
+    # Clean up the response (remove any "Assistant:" prefix if present)
+    if ai_reply.startswith("Assistant:"):
+        ai_reply = ai_reply[10:].strip()
+    
+    logger.info("AI Response (%s): %s", detected_language, ai_reply, extra=SAMPLED)
+    
+    # Update session history (the store keeps only the most recent turns)
+    session_store.append_turn(
+        turn["session_id"],
+        {
+            "user": turn["user_query"],
+            "assistant": ai_reply,
+            "language": detected_language,
+            # Token estimates are stored so later turns can pack history without re-estimating
+            "tokens": [turn["query_tokens"], estimate_tokens(ai_reply)]
+        },
+        turn["session_data"]["primary_language"]
+    )
+    
+    # Keep the session open for follow-up questions instead of making the user re-launch the skill
+    return ai_reply, detected_language, False
+
+def get_error_reply(error_key, accept_language="en-US"):
+    """Localized (text, language) error reply chosen from the Accept-Language header"""
+    detected_language = detect_language("", accept_language)
+    error_messages = get_error_messages(detected_language)
+    return error_messages[error_key], detected_language
+
 @app.route("/alexa", methods=["POST"])
 def alexa_webhook():
     """Enhanced Alexa webhook with Hindi and English language support, using chat-completions format"""
+    deadline = provider_scheduler.Deadline()
+    g.request_start = metrics.begin_request()
     try:
-        payload = request.get_json()
-        logger.debug(f"Received Alexa payload: {payload}")
-        
-        # Extract session information
-        session_id = payload.get("session", {}).get("sessionId", "default")
-        
-        # Extract user query and locale information
-        request_data = payload.get("request", {})
-        intent_data = request_data.get("intent", {})
-        slots = intent_data.get("slots", {})
-        
-        # Get user query from slots
-        user_query = None
-        if "query" in slots and slots["query"].get("value"):
-            user_query = slots["query"]["value"]
-        elif "message" in slots and slots["message"].get("value"):
-            user_query = slots["message"]["value"]
-        else:
-            # Try to extract from other common slot names
-            for slot_name, slot_data in slots.items():
-                if slot_data.get("value"):
-                    user_query = slot_data["value"]
-                    break
-        
-        if not user_query:
-            logger.error("No user query found in request")
-            return create_alexa_response("I didn't understand your request. Please try again.", "en")
-        
-        # Detect language from locale or content
-        request_locale = payload.get("request", {}).get("locale", "en-US")
-        detected_language = detect_language(user_query, request_locale)
-        
-        logger.info(f"Session: {session_id}, Language: {detected_language}, Query: {user_query}")
-        
-        # Check if any AI API token is available
-        if not HF_TOKEN and not OPENAI_API_KEY:
-            error_messages = get_error_messages(detected_language)
-            return create_alexa_response(error_messages["service_unavailable"], detected_language)
-        
-        # Get or create session history with language context
-        if session_id not in chat_history:
-            chat_history[session_id] = {
-                "messages": [],
-                "primary_language": detected_language
-            }
-        
-        session_data = chat_history[session_id]
-        
-        # Update primary language if consistently using a different language
-        if detected_language != session_data["primary_language"]:
-            session_data["primary_language"] = detected_language
-            logger.info(f"Updated primary language for session {session_id} to {detected_language}")
-        
-        # Build chat-completions messages from history (last 3 turns for model context)
-        history = session_data["messages"]
-						 
-								 
-														
-																  
-												  
-															  
-		
-											 
-        system_prompt = get_system_prompt(detected_language)
-        messages = build_chat_messages_from_history(history[-3:], user_query, system_prompt)
+        with metrics.stage_timer("parse"):
+            payload = parse_body(request.get_data(cache=False))
+        turn, reply = prepare_alexa_turn(payload)
+        if reply is not None:
+            return create_alexa_response(*reply)
         
         # Call AI API with fallback system using chat-format messages
-        ai_reply = query_ai_api(messages, user_query, detected_language)
-        
-        if ai_reply is None:
-            error_messages = get_error_messages(detected_language)
-            return create_alexa_response(error_messages["service_unavailable"], detected_language)
-        
-        # Clean up the response (remove any "Assistant:" prefix if present)
-        if ai_reply.startswith("Assistant:"):
-            ai_reply = ai_reply[10:].strip()
-        
-        logger.info(f"AI Response ({detected_language}): {ai_reply}")
-        
-        # Update session history
-        history.append({"user": user_query, "assistant": ai_reply, "language": detected_language})
-        session_data["messages"] = history
+        ai_reply = query_ai_api(turn["messages"], turn["user_query"], turn["language"], deadline)
         
         # Return Alexa-compatible response
-        return create_alexa_response(ai_reply, detected_language)
+        return create_alexa_response(*complete_alexa_turn(turn, ai_reply))
         
-    except KeyError as ke:
-        logger.error(f"Missing key in request payload: {ke}")
-        detected_language = detect_language("", request.headers.get("Accept-Language", "en-US"))
-        error_messages = get_error_messages(detected_language)
-        return create_alexa_response(error_messages["request_error"], detected_language)
+    except Overloaded:
+        return Response(SHED_RESPONSES.get(turn["language"], SHED_RESPONSES["en"]), mimetype="application/json")
+        
+    except (KeyError, InvalidRequest) as e:
+        logger.error("Malformed request payload: %s", e)
+        return create_alexa_response(*get_error_reply("request_error", request.headers.get("Accept-Language", "en-US")))
         
     except Exception as e:
         logger.exception("Unexpected error in Alexa webhook")
-        detected_language = detect_language("", request.headers.get("Accept-Language", "en-US"))
-        error_messages = get_error_messages(detected_language)
-        return create_alexa_response(error_messages["unexpected_error"], detected_language)
+        return create_alexa_response(*get_error_reply("unexpected_error", request.headers.get("Accept-Language", "en-US")))
+
+# Every reply whose text is fixed is rendered once: error messages (both session outcomes),
+# built-in request types, and the canned local intent and fallback replies
+prerender_replies(
+    [(text, language, end_session)
+     for language, messages in ERROR_MESSAGES.items()
+     for text in messages.values()
+     for end_session in (True, False)]
+    + list(BUILTIN_REPLIES.values()) + [SESSION_ENDED_REPLY]
+    + [(text, language, False)
+       for language, responses in intent_index.responses.items()
+       for text in responses.values()]
+    + [(text, language, False) for language, text in DEFAULT_RESPONSES.items()]
+)
+
+# Busy replies for shed turns; the session stays open so the user can simply retry
+SHED_RESPONSES = {
+    language: encode_alexa_response(messages["processing_error"], language, end_session=False)
+    for language, messages in ERROR_MESSAGES.items()
+}
 
 def create_alexa_response(text, language="en", end_session=True):
     """Create Alexa-compatible JSON response"""
-    return jsonify({
-        "version": "1.0",
-        "response": {
-            "outputSpeech": {
-                "type": "PlainText",
-                "text": text
-            },
-            "shouldEndSession": end_session
-        },
-        "sessionAttributes": {
-            "language": language
-        }
-    })
+    with metrics.stage_timer("render"):
+        return Response(encode_alexa_response(text, language, end_session), mimetype="application/json")
+
+@app.after_request
+def add_server_timing(response):
+    """Expose the stage timings of /alexa turns in a Server-Timing header"""
+    request_start = g.pop("request_start", None)
+    if request_start is not None:
+        response.headers["Server-Timing"] = metrics.end_request(request_start)
+    return response
 
 @app.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint"""
     status = {
         "status": "healthy",
-        "huggingface_api": "connected" if HF_TOKEN else "disconnected",
-        "openai_api": "connected" if OPENAI_API_KEY else "disconnected",
-        "ai_service": "available" if (HF_TOKEN or OPENAI_API_KEY) else "unavailable",
-        "supported_languages": ["en", "hi"]
+        "pid": os.getpid(),
+        "huggingface_api": provider_registry.status("huggingface"),
+        "openai_api": provider_registry.status("openai"),
+        "ai_service": "available" if provider_registry.route() else "unavailable",
+        "supported_languages": ["en", "hi"],
+        "provider_endpoints": provider_registry.health(),
+        "provider_pools": provider_client.pool_stats(),
+        "response_cache": response_cache.stats(),
+        "session_store": session_store.stats(),
+        "admission": admission_controller.stats(),
+        "local_model": local_model.stats()
     }
     return jsonify(status)
 
+@app.route("/ready", methods=["GET"])
+def readiness_check():
+    """Readiness probe: 200 once this worker has warmed up, 503 until then"""
+    state = startup.readiness()
+    return jsonify(state), 200 if state["status"] == "ready" else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus metrics for this worker process"""
+    provider_registry.update_metrics()
+    admission_stats = admission_controller.stats()
+    metrics.ADMISSION_IN_FLIGHT.set(value=admission_stats["in_flight"])
+    metrics.ADMISSION_QUEUE_DEPTH.set(value=admission_stats["queue_depth"])
+    metrics.PROVIDER_CALLS_LINGERING.set(value=admission_stats["lingering_calls"])
+    store_stats = session_store.stats()
+    metrics.SESSION_COUNT.set(value=store_stats["sessions"])
+    metrics.SESSION_BYTES.set(value=store_stats["bytes"])
+    metrics.SESSION_EVICTIONS.advance_to(total=store_stats["evictions"])
+    cache_stats = response_cache.stats()
+    for event in ("hits", "misses", "evictions", "expirations", "bypasses"):
+        metrics.CACHE_EVENTS.advance_to(event, total=cache_stats[event])
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/sessions", methods=["GET"])
 def get_sessions():
     """Debug endpoint to view active sessions"""
     session_summary = {}
-    for session_id, data in chat_history.items():
+    for session_id, data in session_store.sessions().items():
         session_summary[session_id] = {
             "primary_language": data["primary_language"],
             "message_count": len(data["messages"]),
@@ -320,6 +592,25 @@ def get_sessions():
         }
     return jsonify(session_summary)
 
+def prebuild_turn_paths():
+    """Build, pack and render one turn per language so first-use work is done before forking"""
+    for language, sample in (("en", "hello"), ("hi", "नमस्ते")):
+        detect_language(sample, f"{language}-IN")
+        intent_index.match(sample, language)
+        messages = build_chat_messages_from_history([], sample, language)
+        build_openai_request(messages)
+        build_huggingface_request(messages)
+        encode_alexa_response(sample, language, end_session=False)
+
+# Shared state is built here, in the gunicorn master when the app is preloaded
+# (gunicorn_config.py); connections are opened per worker (see startup.py)
+startup.prebuild({
+    "turn_paths": prebuild_turn_paths,
+    "templates": lambda: app.jinja_env.get_template("index.html"),
+})
+if not startup.STARTUP_DEFER_WARMUP:
+    startup.start_warm_up()
+
 if __name__ == "__main__":
     logger.info("Starting Enhanced Alexa Skill with Hindi and English support")
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,118 @@
+"""
+Asyncio (ASGI) serving mode for the Alexa webhook.
+
+POST /alexa is handled directly on the event loop with non-blocking provider
+I/O, so an in-flight LLM call no longer pins a worker; every other route is
+served by the Flask app through asgiref's WSGI adapter. Run with:
+
+    gunicorn -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:5000 asgi:app
+
+The sync mode (gunicorn main:app) is unchanged and remains the default.
+Turns waiting on providers here hold no thread, so admission control uses
+the larger ASGI_ADMISSION_MAX_IN_FLIGHT / ASGI_ADMISSION_MAX_QUEUE limits
+(200 calling providers and 800 waiting per process by default).
+"""
+import asyncio
+import logging
+
+from asgiref.wsgi import WsgiToAsgi
+
+import metrics
+import provider_client
+import provider_scheduler
+import startup
+from admission import ASGI_ADMISSION_MAX_IN_FLIGHT, ASGI_ADMISSION_MAX_QUEUE, Overloaded, admission_controller
+from alexa_format import InvalidRequest, encode_alexa_response, loads as parse_body
+from app import (
+    app as flask_app,
+    SHED_RESPONSES,
+    complete_alexa_turn,
+    get_error_reply,
+    prepare_alexa_turn,
+    query_ai_api_async,
+)
+
+logger = logging.getLogger(__name__)
+
+wsgi_fallback = WsgiToAsgi(flask_app)
+admission_controller.configure(ASGI_ADMISSION_MAX_IN_FLIGHT, ASGI_ADMISSION_MAX_QUEUE)
+
+
+async def handle_alexa(payload):
+    """
+    Async counterpart of app.alexa_webhook; returns the (text, language,
+    end_session) reply, or the pre-rendered busy response when the turn was shed
+    """
+    deadline = provider_scheduler.Deadline()
+    # Both ends of the turn read or write the SQLite session store, which can block on
+    # another worker's write lock; run them on a thread so the event loop keeps going
+    turn, reply = await asyncio.to_thread(prepare_alexa_turn, payload)
+    if reply is not None:
+        return reply
+    try:
+        ai_reply = await query_ai_api_async(turn["messages"], turn["user_query"], turn["language"], deadline)
+    except Overloaded:
+        return SHED_RESPONSES.get(turn["language"], SHED_RESPONSES["en"])
+    return await asyncio.to_thread(complete_alexa_turn, turn, ai_reply)
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def alexa_endpoint(scope, receive, send):
+    headers = dict(scope.get("headers") or [])
+    accept_language = headers.get(b"accept-language", b"en-US").decode("latin-1")
+    request_start = metrics.begin_request()
+    try:
+        body = await read_body(receive)
+        with metrics.stage_timer("parse"):
+            payload = parse_body(body)
+        reply = await handle_alexa(payload)
+    except (KeyError, InvalidRequest) as e:
+        logger.error("Malformed request payload: %s", e)
+        reply = get_error_reply("request_error", accept_language)
+    except Exception:
+        logger.exception("Unexpected error in Alexa webhook")
+        reply = get_error_reply("unexpected_error", accept_language)
+
+    with metrics.stage_timer("render"):
+        body = reply if isinstance(reply, bytes) else encode_alexa_response(*reply)
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"server-timing", metrics.end_request(request_start).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Warm the async pools so the first turn skips connection setup; /ready waits for it
+            await startup.warm_up_async()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await provider_client.close_async_clients()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] == "http" and scope["path"] == "/alexa" and scope["method"] == "POST":
+        await alexa_endpoint(scope, receive, send)
+    else:
+        await wsgi_fallback(scope, receive, send)
@@ -0,0 +1,75 @@
+"""
+Measure the local intent short-circuit on a labelled corpus.
+
+For each confidence threshold, reports the share of utterances answered
+locally (never reaching a provider), precision of those local answers, and
+the number of utterances wrongly kept from the providers. Also times
+IntentIndex.answer per call:
+
+    python benchmarks/bench_intent_index.py
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_index import intent_index, INTENT_CONFIDENCE_THRESHOLD  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "intent_corpus.jsonl")
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(corpus, threshold, show_errors=False):
+    answered = correct = wrongly_answered = 0
+    for case in corpus:
+        reply = intent_index.answer(case["text"], case["language"], threshold)
+        intent, _ = intent_index.match(case["text"], case["language"])
+        if reply is None:
+            if show_errors and case["expected"]:
+                print(f"  missed:  {case['text']!r} (expected {case['expected']})")
+            continue
+        answered += 1
+        if intent == case["expected"]:
+            correct += 1
+        else:
+            wrongly_answered += 1
+            if show_errors:
+                print(f"  wrong:   {case['text']!r} answered as {intent} (expected {case['expected']})")
+    return answered, correct, wrongly_answered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--thresholds", default="0.5,0.6,0.75,0.9,1.0")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    local = sum(1 for case in corpus if case["expected"])
+    print(f"Corpus: {len(corpus)} utterances, {local} answerable locally")
+    print(f"{'threshold':>9}  {'local share':>11}  {'precision':>9}  {'wrong':>5}")
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        answered, correct, wrong = evaluate(corpus, threshold)
+        precision = correct / answered if answered else 0.0
+        marker = "  <- configured" if threshold == INTENT_CONFIDENCE_THRESHOLD else ""
+        print(f"{threshold:>9.2f}  {answered / len(corpus):>11.1%}  {precision:>9.1%}  {wrong:>5}{marker}")
+
+    print(f"Errors at configured threshold {INTENT_CONFIDENCE_THRESHOLD}:")
+    evaluate(corpus, INTENT_CONFIDENCE_THRESHOLD, show_errors=True)
+
+    def run():
+        for case in corpus:
+            intent_index.answer(case["text"], case["language"])
+    best = min(timeit.repeat(run, number=200, repeat=5))
+    print(f"answer(): {best / (200 * len(corpus)) * 1e6:.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
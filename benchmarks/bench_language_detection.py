@@ -0,0 +1,93 @@
+"""
+Micro-benchmark and accuracy check for language_utils.detect_language.
+
+Runs the accuracy corpus (benchmarks/data/language_corpus.jsonl) through the
+current detector and the original substring-scan implementation, prints
+per-call latency and accuracy for both, and exits non-zero if the current
+detector's accuracy drops below --min-accuracy:
+
+    python benchmarks/bench_language_detection.py
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from language_utils import detect_language  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "language_corpus.jsonl")
+
+
+def legacy_detect_language(text, locale="en-US"):
+    """The pre-engine implementation, kept for comparison"""
+    if locale:
+        if locale.startswith("hi"):
+            return "hi"
+        elif locale.startswith("en"):
+            return "en"
+    if text and re.search(r'[ऀ-ॿ]', text):
+        return "hi"
+    hindi_transliterated_words = [
+        'namaste', 'kaise', 'kya', 'hai', 'haan', 'nahi', 'aap', 'main',
+        'mera', 'tera', 'uska', 'yahan', 'wahan', 'kahan', 'kab', 'kyun',
+        'achha', 'theek', 'dhanyawad', 'shukriya', 'alvida'
+    ]
+    if text:
+        text_lower = text.lower()
+        for word in hindi_transliterated_words:
+            if word in text_lower:
+                return "hi"
+    return "en"
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(detector, corpus, show_errors=False):
+    correct = 0
+    for case in corpus:
+        got = detector(case["text"], case["locale"])
+        if got == case["expected"]:
+            correct += 1
+        elif show_errors:
+            print(f"  miss: {case['text']!r} locale={case['locale']!r} expected={case['expected']} got={got}")
+    return correct / len(corpus)
+
+
+def time_per_call(detector, corpus, repeat):
+    def run():
+        for case in corpus:
+            detector(case["text"], case["locale"])
+    best = min(timeit.repeat(run, number=repeat, repeat=5))
+    return best / (repeat * len(corpus)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--repeat", type=int, default=200, help="Corpus passes per timing run")
+    parser.add_argument("--min-accuracy", type=float, default=0.95)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    print(f"Corpus: {len(corpus)} utterances")
+    for name, detector in (("legacy", legacy_detect_language), ("current", detect_language)):
+        accuracy = evaluate(detector, corpus, show_errors=(name == "current"))
+        micros = time_per_call(detector, corpus, args.repeat)
+        print(f"{name:>8}: accuracy {accuracy:.1%}  {micros:.2f} us/call")
+
+    accuracy = evaluate(detect_language, corpus)
+    if accuracy < args.min_accuracy:
+        print(f"FAIL: accuracy {accuracy:.1%} below {args.min_accuracy:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Time the on-box inference tier: model load (map) time, and generation
+latency per language both called directly and through the worker pool the
+webhook uses, with reply lengths checked against the voice limits:
+
+    python benchmarks/bench_local_inference.py
+    python benchmarks/bench_local_inference.py --backend llama_cpp --model path/to/model.gguf --runs 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from language_utils import get_voice_length_limit  # noqa: E402
+from local_inference import BUNDLED_MODEL_PATH, LocalModel  # noqa: E402
+from provider_scheduler import Deadline  # noqa: E402
+
+QUESTIONS = {
+    "en": ["What is a black hole?", "Tell me about the sun", "How does the internet work?", "Why is water wet?"],
+    "hi": ["पानी किससे बना है?", "सूरज के बारे में बताइए", "भारत में कितनी भाषाएँ हैं?", "दिल क्या करता है?"],
+}
+
+
+def messages_for(question):
+    return [{"role": "user", "content": question}]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="bigram")
+    parser.add_argument("--model", default=None, help="model path (default: the bundled bigram model)")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    model = LocalModel(args.backend, args.model or BUNDLED_MODEL_PATH)
+    if not model.enabled:
+        sys.exit(f"Could not load {args.backend} model")
+    print(f"{args.backend}: {model.model.size} bytes mapped in {model.load_ms} ms")
+
+    for language, questions in QUESTIONS.items():
+        limit = get_voice_length_limit(language)
+        direct, pooled, longest = [], [], 0
+        for run in range(args.runs):
+            question = questions[run % len(questions)]
+            start = time.perf_counter()
+            model.model.generate(messages_for(question), language, limit, time.monotonic() + 30)
+            direct.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            reply = model.generate(messages_for(question), language, Deadline(30))
+            pooled.append(time.perf_counter() - start)
+            longest = max(longest, len(reply or ""))
+        print(f"{language}: direct median {statistics.median(direct) * 1000:.3f} ms, "
+              f"via pool median {statistics.median(pooled) * 1000:.3f} ms, "
+              f"longest reply {longest}/{limit} chars")
+        print(f"    e.g. {questions[0]!r} -> {model.generate(messages_for(questions[0]), language, Deadline(30))!r}")
+
+
+if __name__ == "__main__":
+    main()
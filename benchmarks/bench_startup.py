@@ -0,0 +1,160 @@
+"""
+Measure cold start: how long a fresh process takes to import the app, and
+how long a new gunicorn server takes to become ready and answer its first
+Alexa turn, with and without preloading (gunicorn_config.py).
+
+Servers run against benchmarks/mock_provider.py, as in load_driver.py. On
+Linux the private (not shared with the master) memory of each worker is
+reported too, which shows how much preloading shares copy-on-write:
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --workers 4
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_driver import REPO_DIR, build_intent_request, free_port, load_scenarios, start_mock, stop  # noqa: E402
+
+MODES = {
+    "plain": [],
+    "preload": ["-c", "gunicorn_config.py"],
+}
+
+
+def time_import(runs):
+    """Wall-clock seconds for `python -c "import app"` in fresh interpreters"""
+    env = dict(os.environ, STARTUP_DEFER_WARMUP="true", LOG_LEVEL="WARNING")
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import app"], cwd=REPO_DIR, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def poll(url, timeout=30.0, data=None):
+    """Seconds until url answers 200 (POSTing data when given)"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+                return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.01)
+    raise RuntimeError(f"{url} was not ready within {timeout:.0f}s")
+
+
+def worker_pids(master_pid):
+    path = f"/proc/{master_pid}/task/{master_pid}/children"
+    try:
+        with open(path) as f:
+            return [int(pid) for pid in f.read().split()]
+    except OSError:
+        return []
+
+
+def private_kib(pid):
+    """Private (unshared) resident memory of a process, from smaps_rollup"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None
+    return sum(int(fields.get(key, "0 kB").split()[0]) for key in ("Private_Clean", "Private_Dirty"))
+
+
+def cold_start(mode, workers, threads, mock_port, session_dir, payload):
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "test",
+        "OPENAI_API_URL": f"http://127.0.0.1:{mock_port}/v1/chat/completions",
+        "HF_TOKEN": "test",
+        "HF_API_URL": f"http://127.0.0.1:{mock_port}/models/mock",
+        "SESSION_STORE_PATH": os.path.join(session_dir, f"sessions-{port}.db"),
+        "LOG_LEVEL": "WARNING",
+        "PORT": str(port),
+        "WEB_CONCURRENCY": str(workers),
+        "GUNICORN_THREADS": str(threads),
+    })
+    command = [sys.executable, "-m", "gunicorn", *MODES[mode],
+               "--bind", f"127.0.0.1:{port}", "-w", str(workers), "--threads", str(threads), "main:app"]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=REPO_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        poll(f"http://127.0.0.1:{port}/ready")
+        ready = time.perf_counter() - start
+        first_reply_latency = poll(f"http://127.0.0.1:{port}/alexa", data=payload)
+        first_reply = time.perf_counter() - start
+        memory = [private_kib(pid) for pid in worker_pids(process.pid)]
+    finally:
+        stop(process)
+    return {
+        "ready_ms": round(ready * 1000, 1),
+        "first_reply_ms": round(first_reply * 1000, 1),
+        "first_turn_ms": round(first_reply_latency * 1000, 1),
+        "worker_private_kib": [kib for kib in memory if kib is not None],
+    }
+
+
+def summarize(runs, key):
+    values = sorted(run[key] for run in runs)
+    return {"median": round(statistics.median(values), 1), "min": values[0], "max": values[-1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--modes", default="plain,preload", help="comma-separated: " + ",".join(MODES))
+    parser.add_argument("--json", action="store_true", help="print the raw results as JSON")
+    args = parser.parse_args()
+
+    scenario = load_scenarios()[0]
+    payload = json.dumps(build_intent_request(scenario, "amzn1.echo-api.session.startup", 0,
+                                              scenario["turns"][0])).encode("utf-8")
+    imports = time_import(args.runs)
+    results = {"import_app_ms": [round(t * 1000, 1) for t in imports], "modes": {}}
+
+    mock_port = free_port()
+    mock = start_mock(mock_port, "")
+    try:
+        with tempfile.TemporaryDirectory() as session_dir:
+            for mode in args.modes.split(","):
+                results["modes"][mode] = [
+                    cold_start(mode, args.workers, args.threads, mock_port, session_dir, payload)
+                    for _ in range(args.runs)
+                ]
+    finally:
+        stop(mock)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"import app: median {statistics.median(imports) * 1000:.1f} ms over {args.runs} runs")
+    print(f"{'mode':<10}{'ready ms':>12}{'first reply ms':>16}{'first turn ms':>15}{'worker private MiB':>20}")
+    for mode, runs in results["modes"].items():
+        memory = [kib for run in runs for kib in run["worker_private_kib"]]
+        print(f"{mode:<10}{summarize(runs, 'ready_ms')['median']:>12}"
+              f"{summarize(runs, 'first_reply_ms')['median']:>16}"
+              f"{summarize(runs, 'first_turn_ms')['median']:>15}"
+              f"{(statistics.median(memory) / 1024 if memory else float('nan')):>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+"""
+Replay the Alexa session corpus against /alexa and report throughput and latency.
+
+By default the driver starts benchmarks/mock_provider.py and one gunicorn
+server per worker/thread configuration, with OPENAI_API_URL and HF_API_URL
+pointing at the mock, then drives each server with closed-loop clients that
+replay whole sessions turn by turn:
+
+    python benchmarks/load_driver.py --configs 1x1,2x4,4x8 --concurrency 32 --duration 20
+    python benchmarks/load_driver.py --configs 2x4 --mock-args="--openai-latency lognormal:400,0.5"
+
+While each run is recorded /health is polled, so the results also show the
+admission limits, the peak in-flight and queued turns, and how many turns
+were shed. By default the servers run with the response cache and local intent answers
+turned off. The corpus repeats itself and the mock always gives the same
+reply, so with them on most turns would be cache hits, not webhook and
+provider-chain work. Use --cache / --local-intents to include them. The
+provider calls and the cache hit ratio are recorded for every run. Use
+--url to drive an already running server instead. Every run is saved to
+benchmarks/results/<timestamp>-<git sha>.json; compare two runs with:
+
+    python benchmarks/load_driver.py --compare results/a.json results/b.json
+"""
+import argparse
+import json
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+CORPUS_PATH = os.path.join(BENCH_DIR, "data", "alexa_sessions.jsonl")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def load_scenarios(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def build_intent_request(scenario, session_id, turn_index, text):
+    """Expand one scenario turn into a full Alexa IntentRequest envelope"""
+    return {
+        "version": "1.0",
+        "session": {
+            "new": turn_index == 0,
+            "sessionId": session_id,
+            "application": {"applicationId": "amzn1.ask.skill.benchmark"},
+            "user": {"userId": "amzn1.ask.account.benchmark"},
+        },
+        "context": {
+            "System": {
+                "application": {"applicationId": "amzn1.ask.skill.benchmark"},
+                "user": {"userId": "amzn1.ask.account.benchmark"},
+            }
+        },
+        "request": {
+            "type": "IntentRequest",
+            "requestId": f"amzn1.echo-api.request.{uuid.uuid4()}",
+            "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "locale": scenario["locale"],
+            "intent": {
+                "name": "ChatIntent",
+                "confirmationStatus": "NONE",
+                "slots": {scenario["slot"]: {"name": scenario["slot"], "value": text}},
+            },
+        },
+    }
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, timeout=30.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def git_sha():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class LoadRun:
+    """Closed-loop load: each client replays sessions back to back until the duration is over"""
+
+    def __init__(self, url, scenarios, concurrency, duration, timeout=15.0):
+        self.url = url
+        self.scenarios = scenarios
+        self.concurrency = concurrency
+        self.duration = duration
+        self.timeout = timeout
+        self.latencies = []
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def post(self, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(self.url, data=data, headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.loads(response.read())
+            error = None if "response" in body else "bad_body"
+        except urllib.error.HTTPError as e:
+            error = f"http_{e.code}"
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            error = type(getattr(e, "reason", e)).__name__
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            if error is None:
+                self.latencies.append(elapsed)
+            else:
+                self.errors[error] = self.errors.get(error, 0) + 1
+
+    def client(self, client_index, stop_at):
+        position = client_index
+        while time.monotonic() < stop_at:
+            scenario = self.scenarios[position % len(self.scenarios)]
+            session_id = f"amzn1.echo-api.session.bench-{client_index}-{position}"
+            for turn_index, text in enumerate(scenario["turns"]):
+                if time.monotonic() >= stop_at:
+                    return
+                self.post(build_intent_request(scenario, session_id, turn_index, text))
+            position += self.concurrency
+
+    def run(self):
+        start = time.monotonic()
+        stop_at = start + self.duration
+        threads = [threading.Thread(target=self.client, args=(i, stop_at), daemon=True)
+                   for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+
+        latencies = sorted(self.latencies)
+        errors = sum(self.errors.values())
+        return {
+            "requests": len(latencies) + errors,
+            "errors": errors,
+            "error_kinds": self.errors,
+            "duration_s": round(elapsed, 2),
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        }
+
+
+class HealthSampler:
+    """Poll /health during a run and keep each worker's latest admission stats"""
+
+    def __init__(self, health_url, interval=0.25):
+        self.health_url = health_url
+        self.interval = interval
+        self.workers = {}
+        self.caches = {}
+        self.max_queue_depth = 0
+        self.max_in_flight = 0
+        self.max_lingering = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with urllib.request.urlopen(self.health_url, timeout=2) as response:
+                    health = json.loads(response.read())
+            except (urllib.error.URLError, OSError, ValueError):
+                continue
+            admission = health.get("admission")
+            if not admission:
+                continue
+            self.workers[health.get("pid")] = admission
+            self.caches[health.get("pid")] = health.get("response_cache") or {}
+            self.max_queue_depth = max(self.max_queue_depth, admission["queue_depth"])
+            self.max_in_flight = max(self.max_in_flight, admission["in_flight"])
+            self.max_lingering = max(self.max_lingering, admission.get("lingering_calls", 0))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def cache_summary(self):
+        """Response cache hits and misses summed over the workers seen (cumulative since server start)"""
+        hits = sum(cache.get("hits", 0) for cache in self.caches.values())
+        misses = sum(cache.get("misses", 0) for cache in self.caches.values())
+        return {
+            "enabled": any(cache.get("enabled") for cache in self.caches.values()),
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        }
+
+    def summary(self):
+        """Admission counters summed over the workers seen (cumulative since server start)"""
+        shed = {}
+        for admission in self.workers.values():
+            for reason, count in admission["shed"].items():
+                shed[reason] = shed.get(reason, 0) + count
+        limits = next(iter(self.workers.values()), {})
+        return {
+            "workers_sampled": len(self.workers),
+            "max_in_flight": limits.get("max_in_flight"),
+            "max_queue": limits.get("max_queue"),
+            "admitted": sum(admission["admitted"] for admission in self.workers.values()),
+            "shed": shed,
+            "peak_in_flight": self.max_in_flight,
+            "peak_queue_depth": self.max_queue_depth,
+            "peak_lingering_calls": self.max_lingering,
+        }
+
+
+def start_mock(port, mock_args):
+    command = [sys.executable, os.path.join(BENCH_DIR, "mock_provider.py"), "--port", str(port)]
+    process = subprocess.Popen(command + shlex.split(mock_args), cwd=REPO_DIR,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for(f"http://127.0.0.1:{port}/stats")
+    return process
+
+
+def start_server(port, workers, threads, mock_port, worker_class, session_dir, cache=False, local_intents=False):
+    env = dict(os.environ)
+    env.update({
+        # The corpus repeats itself and the mock always gives the same reply, so by default the
+        # response cache and local intents are off and every turn reaches the provider chain
+        "RESPONSE_CACHE_ENABLED": "true" if cache else "false",
+        "LOCAL_INTENTS_ENABLED": "true" if local_intents else "false",
+        "OPENAI_API_KEY": env.get("BENCH_OPENAI_API_KEY", "test"),
+        "OPENAI_API_URL": f"http://127.0.0.1:{mock_port}/v1/chat/completions",
+        "HF_TOKEN": env.get("BENCH_HF_TOKEN", "test"),
+        "HF_API_URL": f"http://127.0.0.1:{mock_port}/models/mock",
+        "SESSION_STORE_PATH": os.path.join(session_dir, f"sessions-{port}.db"),
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+        # Admission limits are derived from the thread count, as under gunicorn_config.py
+        "GUNICORN_THREADS": str(threads),
+    })
+    command = [
+        sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+        "-w", str(workers), "--threads", str(threads), "--timeout", "60",
+    ]
+    if worker_class:
+        command += ["-k", worker_class]
+    command.append("asgi:app" if worker_class and "uvicorn" in worker_class else "main:app")
+    process = subprocess.Popen(command, cwd=REPO_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for(f"http://127.0.0.1:{port}/health")
+    return process
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def mock_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=2) as response:
+        return json.loads(response.read())
+
+
+def print_row(label, result):
+    print(f"{label:>10}  {result['requests']:>8}  {result['errors']:>6}  {result['throughput_rps']:>8.1f}  "
+          f"{result['p50_ms']:>8.1f}  {result['p95_ms']:>8.1f}  {result['p99_ms']:>8.1f}")
+    if "provider_calls" in result:
+        cache = result["response_cache"]
+        print(f"{'':>10}  provider calls: {result['provider_calls']}, response cache "
+              f"{'on' if cache['enabled'] else 'off'} (hit ratio {cache['hit_ratio']:.1%})")
+    admission = result.get("admission")
+    if admission:
+        print(f"{'':>10}  admission: {admission['max_in_flight']} slots + {admission['max_queue']} queued per worker, "
+              f"peak in flight {admission['peak_in_flight']}, peak queue {admission['peak_queue_depth']}, "
+              f"shed {admission['shed']}, peak lingering calls {admission.get('peak_lingering_calls', 0)}")
+
+
+def print_header():
+    print(f"{'config':>10}  {'requests':>8}  {'errors':>6}  {'req/s':>8}  "
+          f"{'p50 ms':>8}  {'p95 ms':>8}  {'p99 ms':>8}")
+
+
+def compare(baseline_path, candidate_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+    print(f"baseline:  {baseline['git_sha']} ({baseline['timestamp']})")
+    print(f"candidate: {candidate['git_sha']} ({candidate['timestamp']})")
+    print(f"{'config':>10}  {'metric':>14}  {'baseline':>10}  {'candidate':>10}  {'change':>8}")
+    for label, new in candidate["results"].items():
+        old = baseline["results"].get(label)
+        if old is None:
+            continue
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "errors"):
+            change = (new[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0
+            print(f"{label:>10}  {metric:>14}  {old[metric]:>10}  {new[metric]:>10}  {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", default="1x1,2x4,4x8", help="Comma-separated WORKERSxTHREADS settings")
+    parser.add_argument("--worker-class", default="", help="gunicorn worker class, e.g. uvicorn.workers.UvicornWorker")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent closed-loop clients")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds of load per configuration")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds of unrecorded load before each run")
+    parser.add_argument("--mock-args", default="--openai-latency lognormal:300,0.4 --hf-latency lognormal:600,0.5",
+                        help="Extra arguments for mock_provider.py")
+    parser.add_argument("--cache", action="store_true", help="Keep the response cache on in the servers")
+    parser.add_argument("--local-intents", action="store_true", help="Keep local intent answers on in the servers")
+    parser.add_argument("--url", help="Drive this /alexa URL instead of starting servers")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--output", help="Results file (default benchmarks/results/<timestamp>-<sha>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="Compare two results files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    scenarios = load_scenarios(args.corpus)
+    turns = sum(len(s["turns"]) for s in scenarios)
+    print(f"Corpus: {len(scenarios)} sessions, {turns} turns; {args.concurrency} clients, {args.duration:.0f}s per run")
+
+    results = {}
+    mock_counters = {}
+    print_header()
+    if args.url:
+        if args.warmup:
+            LoadRun(args.url, scenarios, args.concurrency, args.warmup).run()
+        results["external"] = LoadRun(args.url, scenarios, args.concurrency, args.duration).run()
+        print_row("external", results["external"])
+    else:
+        mock_port = free_port()
+        mock = start_mock(mock_port, args.mock_args)
+        try:
+            with tempfile.TemporaryDirectory() as session_dir:
+                for config in args.configs.split(","):
+                    workers, threads = (int(v) for v in config.lower().split("x"))
+                    port = free_port()
+                    server = start_server(port, workers, threads, mock_port, args.worker_class, session_dir,
+                                          cache=args.cache, local_intents=args.local_intents)
+                    try:
+                        url = f"http://127.0.0.1:{port}/alexa"
+                        if args.warmup:
+                            LoadRun(url, scenarios, args.concurrency, args.warmup).run()
+                        calls_before = mock_stats(mock_port)
+                        with HealthSampler(f"http://127.0.0.1:{port}/health") as sampler:
+                            results[config] = LoadRun(url, scenarios, args.concurrency, args.duration).run()
+                        calls_after = mock_stats(mock_port)
+                        results[config]["provider_calls"] = sum(
+                            calls_after[name] - calls_before[name] for name in ("openai", "huggingface"))
+                        results[config]["response_cache"] = sampler.cache_summary()
+                        results[config]["admission"] = sampler.summary()
+                    finally:
+                        stop(server)
+                    print_row(config, results[config])
+            mock_counters = mock_stats(mock_port)
+        finally:
+            stop(mock)
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    sha = git_sha()
+    report = {
+        "timestamp": timestamp,
+        "git_sha": sha,
+        "settings": {
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "worker_class": args.worker_class or "sync",
+            "response_cache": args.cache,
+            "local_intents": args.local_intents,
+            "mock_args": None if args.url else args.mock_args,
+            "url": args.url,
+            "corpus": os.path.relpath(args.corpus, REPO_DIR),
+        },
+        "mock_provider": mock_counters,
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{timestamp}-{sha}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Local mock of the OpenAI and HuggingFace inference endpoints.
+
+Point the app at it to exercise the provider code without network access:
+
+    python benchmarks/mock_provider.py --port 8081 --openai-latency lognormal:400,0.5 --hf-error-rate 0.1
+    OPENAI_API_KEY=test OPENAI_API_URL=http://127.0.0.1:8081/v1/chat/completions \
+        HF_TOKEN=test HF_API_URL=http://127.0.0.1:8081/models/mock gunicorn main:app
+
+Requests to a path ending in /chat/completions get OpenAI-style replies
+(SSE-streamed when the payload sets "stream": true); any other POST gets a
+HuggingFace text-generation reply ([{"generated_text": ...}], one entry per
+input when "inputs" is a list).
+
+Latency distributions are given as fixed:MS, uniform:MIN_MS,MAX_MS or
+lognormal:MEDIAN_MS,SIGMA. A share of requests (--*-error-rate) fails with a
+503 or 429. Streaming replies are sent one word per SSE event with
+--token-delay seconds between events; streams the client closes early are
+counted, so early cutoff can be observed directly. GET /stats returns the
+request, error and stream counters.
+"""
+import argparse
+import json
+import logging
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("mock_provider")
+
+DEFAULT_REPLY = (
+    "This is a mock reply from the local provider. It is long enough to run past the voice limit. "
+    "Every sentence adds a few more words so the stream keeps going. The app should stop reading soon. "
+    "If you can hear this sentence the early cutoff did not work. Here is yet another sentence. "
+    "And one more for good measure, followed by a final closing sentence."
+)
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution spec into a sampler returning seconds
+
+    Args:
+        spec: 'fixed:MS', 'uniform:MIN_MS,MAX_MS' or 'lognormal:MEDIAN_MS,SIGMA'
+
+    Returns:
+        Zero-argument callable
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        mu = math.log(values[0] / 1000)
+        return lambda: random.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class ProviderBehaviour:
+    """Latency and error profile of one mocked provider"""
+
+    def __init__(self, latency="fixed:0", error_rate=0.0):
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+
+
+class MockProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    reply = DEFAULT_REPLY
+    token_delay = 0.02
+    send_done = True
+    openai = ProviderBehaviour()
+    huggingface = ProviderBehaviour()
+    stats = {"openai": 0, "huggingface": 0, "errors": 0, "streams": 0, "streams_cut_off": 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.stats_lock:
+                self.send_json(dict(self.stats))
+        else:
+            self.send_json({"status": "ok"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        is_openai = self.path.rstrip("/").endswith("/chat/completions")
+        name = "openai" if is_openai else "huggingface"
+        behaviour = self.openai if is_openai else self.huggingface
+        self.count(name)
+
+        time.sleep(behaviour.sample_latency())
+        if random.random() < behaviour.error_rate:
+            self.count("errors")
+            status = random.choice((503, 429))
+            self.send_json({"error": "mock failure"}, status=status)
+            return
+
+        if is_openai and body.get("stream"):
+            self.stream_chat_completion()
+        elif is_openai:
+            self.send_json({"choices": [{"message": {"role": "assistant", "content": self.reply}}]})
+        else:
+            inputs = body.get("inputs", "")
+            prompts = inputs if isinstance(inputs, list) else [inputs]
+            results = [{"generated_text": f"{prompt} {self.reply}"} for prompt in prompts]
+            self.send_json(results)
+
+    def send_json(self, data, status=200):
+        encoded = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def write_chunk(self, data):
+        # Like the real endpoint, stream with chunked transfer encoding (one chunk per event)
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def stream_chat_completion(self):
+        self.count("streams")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        words = self.reply.split(" ")
+        sent = 0
+        try:
+            for i, word in enumerate(words):
+                delta = {"content": word if i == 0 else " " + word}
+                event = {"choices": [{"index": 0, "delta": delta}]}
+                self.write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                sent += 1
+                time.sleep(self.token_delay)
+            if self.send_done:
+                self.write_chunk(b"data: [DONE]\n\n")
+            self.write_chunk(b"")
+            logger.debug(f"Stream completed: {sent}/{len(words)} tokens sent")
+        except (BrokenPipeError, ConnectionResetError):
+            self.count("streams_cut_off")
+            logger.debug(f"Client closed stream after {sent}/{len(words)} tokens")
+        self.close_connection = True
+
+
+class MockProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open many connections at once; the socketserver default backlog is 5
+    request_queue_size = 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between streamed tokens")
+    parser.add_argument("--no-done", action="store_true", help="End streams without the [DONE] event")
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="Text every completion returns")
+    parser.add_argument("--openai-latency", default="fixed:0", help="OpenAI latency distribution")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--hf-latency", default="fixed:0", help="HuggingFace latency distribution")
+    parser.add_argument("--hf-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    MockProviderHandler.reply = args.reply
+    MockProviderHandler.token_delay = args.token_delay
+    MockProviderHandler.send_done = not args.no_done
+    MockProviderHandler.openai = ProviderBehaviour(args.openai_latency, args.openai_error_rate)
+    MockProviderHandler.huggingface = ProviderBehaviour(args.hf_latency, args.hf_error_rate)
+    server = MockProviderServer((args.host, args.port), MockProviderHandler)
+    logger.info(f"Mock provider listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
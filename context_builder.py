@@ -0,0 +1,181 @@
+"""
+Token-budgeted chat context for provider requests.
+
+Instead of always sending the last three turns, the context builder packs
+as many recent turns as fit a token budget, newest first. Token counts are
+estimated once per utterance and stored with the session turn, so packing a
+long history only adds up integers. System prompts are pre-built per
+language, and the HuggingFace plain-text prompt is joined from per-message
+segments rendered once rather than re-concatenated line by line.
+
+Counts are a character-based estimate (no tokenizer dependency): roughly
+four ASCII characters per token, and far fewer Devanagari characters, which
+BPE vocabularies split finely.
+"""
+import os
+from typing import Dict, Iterable, List, Optional
+
+from language_utils import SYSTEM_PROMPTS
+
+# Whole-prompt token budgets (system prompt + history + current question)
+CONTEXT_TOKEN_BUDGETS = {
+    "openai": int(os.getenv("CONTEXT_TOKENS_OPENAI", "1500")),
+    "huggingface": int(os.getenv("CONTEXT_TOKENS_HF", "700")),
+}
+# Per-message framing (role markers) added by chat templates
+MESSAGE_OVERHEAD_TOKENS = 4
+ASCII_CHARS_PER_TOKEN = 4.0
+NON_ASCII_TOKENS_PER_CHAR = 0.7
+
+_HF_ROLE_PREFIXES = {"user": "User: ", "assistant": "Assistant: "}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of a message
+
+    Args:
+        text: Message content
+
+    Returns:
+        Estimated tokens, including the per-message overhead
+    """
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    other_chars = len(text) - ascii_chars
+    return int(ascii_chars / ASCII_CHARS_PER_TOKEN + other_chars * NON_ASCII_TOKENS_PER_CHAR) + 1 + MESSAGE_OVERHEAD_TOKENS
+
+
+def turn_token_counts(turn: Dict) -> List[int]:
+    """[user tokens, assistant tokens] of a stored turn (estimated for turns stored before counts existed)"""
+    counts = turn.get("tokens")
+    if counts:
+        return counts
+    return [estimate_tokens(turn.get("user") or ""), estimate_tokens(turn.get("assistant") or "")]
+
+
+def _hf_segment(message: Dict[str, str]) -> str:
+    if message["role"] == "system":
+        return message["content"].strip() + "\n"
+    return f"{_HF_ROLE_PREFIXES.get(message['role'], 'User: ')}{message['content'].strip()}\n"
+
+
+class ChatMessages(list):
+    """
+    A chat-completions messages array that carries per-message token counts
+    and pre-rendered HuggingFace prompt segments
+
+    It is still a plain list of {"role", "content"} dicts to everything that
+    serializes or fingerprints it.
+    """
+
+    def __init__(self, messages: Iterable[Dict[str, str]] = (), tokens: Optional[List[int]] = None,
+                 segments: Optional[List[str]] = None):
+        super().__init__(messages)
+        self.tokens = tokens if tokens is not None else [estimate_tokens(m["content"]) for m in self]
+        self.segments = segments
+
+    def total_tokens(self) -> int:
+        return sum(self.tokens)
+
+    def fit(self, budget: int) -> "ChatMessages":
+        """
+        Drop the oldest history turns until the messages fit a token budget
+
+        The system prompt and the current question are always kept.
+
+        Args:
+            budget: Token budget for the whole prompt
+
+        Returns:
+            self when it already fits, otherwise a shorter ChatMessages
+        """
+        total = self.total_tokens()
+        if total <= budget:
+            return self
+        start = 1 if self and self[0]["role"] == "system" else 0
+        drop = start
+        # Drop whole turns: a user message and the assistant reply that follows it
+        while drop < len(self) - 1 and total > budget:
+            total -= self.tokens[drop]
+            drop += 1
+            if drop < len(self) - 1 and self[drop]["role"] == "assistant":
+                total -= self.tokens[drop]
+                drop += 1
+        keep = list(range(start)) + list(range(drop, len(self)))
+        return ChatMessages(
+            [self[i] for i in keep],
+            [self.tokens[i] for i in keep],
+            [self.hf_segments()[i] for i in keep],
+        )
+
+    def hf_segments(self) -> List[str]:
+        if self.segments is None:
+            self.segments = [_hf_segment(m) for m in self]
+        return self.segments
+
+    def hf_prompt(self) -> str:
+        """Plain-text prompt for HuggingFace text generation"""
+        return "".join(self.hf_segments()) + "Assistant:"
+
+
+def as_chat_messages(messages: Iterable[Dict[str, str]]) -> ChatMessages:
+    """Wrap a plain messages list (estimating its counts) unless it already is a ChatMessages"""
+    return messages if isinstance(messages, ChatMessages) else ChatMessages(messages)
+
+
+def _build_system_messages() -> Dict[str, tuple]:
+    built = {}
+    for language, prompt in SYSTEM_PROMPTS.items():
+        message = {"role": "system", "content": prompt}
+        built[language] = (message, estimate_tokens(prompt), _hf_segment(message))
+    return built
+
+
+# language -> (message dict, tokens, HF segment); shared, never mutated
+SYSTEM_MESSAGES = _build_system_messages()
+
+
+def build_context(history: List[Dict], user_query: str, language: str = "en",
+                  budget: Optional[int] = None, query_tokens: Optional[int] = None) -> ChatMessages:
+    """
+    Pack the most recent turns that fit the budget into a messages array
+
+    Args:
+        history: Stored session turns, oldest first
+        user_query: Current question
+        language: Language code selecting the system prompt
+        budget: Token budget (default: the largest provider budget)
+        query_tokens: Precomputed estimate for user_query
+
+    Returns:
+        ChatMessages: system prompt, packed history, current question
+    """
+    if budget is None:
+        budget = max(CONTEXT_TOKEN_BUDGETS.values())
+    system_message, system_tokens, system_segment = SYSTEM_MESSAGES.get(language, SYSTEM_MESSAGES["en"])
+    if query_tokens is None:
+        query_tokens = estimate_tokens(user_query)
+
+    remaining = budget - system_tokens - query_tokens
+    packed = []
+    for turn in reversed(history):
+        counts = turn_token_counts(turn)
+        cost = (counts[0] if turn.get("user") else 0) + (counts[1] if turn.get("assistant") else 0)
+        if cost > remaining:
+            break
+        remaining -= cost
+        packed.append((turn, counts))
+
+    messages, tokens, segments = [system_message], [system_tokens], [system_segment]
+    for turn, counts in reversed(packed):
+        for role, count in (("user", counts[0]), ("assistant", counts[1])):
+            if turn.get(role):
+                message = {"role": role, "content": turn[role]}
+                messages.append(message)
+                tokens.append(count)
+                segments.append(_hf_segment(message))
+    query_message = {"role": "user", "content": user_query}
+    messages.append(query_message)
+    tokens.append(query_tokens)
+    segments.append(_hf_segment(query_message))
+    return ChatMessages(messages, tokens, segments)
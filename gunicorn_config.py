@@ -0,0 +1,31 @@
+"""
+Gunicorn settings for deployments (gunicorn -c gunicorn_config.py main:app).
+
+The app is preloaded: it is imported once in the master, and the workers
+forked from it share the already-built state (compiled patterns, intent
+index, pre-built prompts and replies) copy-on-write instead of each
+importing and building it again. Each worker then opens its own provider
+connections from post_fork and reports ready on /ready once that is done.
+
+Preloading cannot be combined with --reload, so the development workflow
+keeps its plain command line.
+"""
+import os
+
+# Read by startup.py when the app is imported in the master
+os.environ.setdefault("STARTUP_DEFER_WARMUP", "true")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# admission.py sizes its provider slots and wait queue from the thread count
+os.environ["GUNICORN_THREADS"] = str(threads)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+preload_app = True
+reuse_port = True
+
+
+def post_fork(server, worker):
+    # Sockets and threads do not survive the fork; warm this worker's own pools
+    import startup
+    startup.start_warm_up()
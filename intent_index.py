@@ -0,0 +1,201 @@
+import os
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from response_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Minimum confidence for answering locally instead of calling a provider
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.75"))
+LOCAL_INTENTS_ENABLED = os.getenv("LOCAL_INTENTS_ENABLED", "true").lower() == "true"
+
+# Per language: intent -> phrases and localized response. Intents with
+# "short_circuit": False are only used by get_fallback_response (a provider
+# may still give a better answer than the canned text).
+INTENT_TABLES = {
+    "en": {
+        "greeting": {
+            "phrases": ["hello", "hi", "hey", "hi there", "hello there", "good morning", "good evening",
+                        "good afternoon", "namaste"],
+            "response": "Hello! I'm here to help you.",
+        },
+        "how_are_you": {
+            "phrases": ["how are you", "how are you doing", "how is it going", "how do you do"],
+            "response": "I'm doing well, thank you! How is your day going?",
+        },
+        "name": {
+            "phrases": ["what is your name", "what s your name", "whats your name", "who are you", "your name",
+                        "name"],
+            "response": "I'm an AI assistant that can communicate in both Hindi and English.",
+        },
+        "help": {
+            "phrases": ["help", "help me", "can you help me", "what can you do", "how can you help",
+                        "how can you help me", "what can you help me with"],
+            "response": "I can answer questions and have conversations. What would you like to know?",
+        },
+        "thanks": {
+            "phrases": ["thanks", "thank you", "thank you very much", "thanks a lot"],
+            "response": "You're welcome! Is there anything else you'd like to know?",
+        },
+        "weather": {
+            "phrases": ["weather"],
+            "response": "I don't have access to weather information, but I can help with other questions.",
+            "short_circuit": False,
+        },
+        "time": {
+            "phrases": ["time"],
+            "response": "I don't know the current time, but I can answer other questions.",
+            "short_circuit": False,
+        },
+    },
+    "hi": {
+        "greeting": {
+            "phrases": ["नमस्ते", "नमस्कार", "हेलो", "namaste", "namaskar", "hello", "hi"],
+            "response": "नमस्ते! मैं आपकी सहायता के लिए यहाँ हूँ।",
+        },
+        "how_are_you": {
+            "phrases": ["आप कैसे हैं", "आप कैसे हो", "कैसे हो", "क्या हाल है", "aap kaise hain", "aap kaise ho",
+                        "kaise ho", "kya haal hai", "how are you"],
+            "response": "मैं ठीक हूँ, धन्यवाद! आपका दिन कैसा है?",
+        },
+        "name": {
+            "phrases": ["आपका नाम क्या है", "तुम्हारा नाम क्या है", "आप कौन हैं", "तुम कौन हो", "aapka naam kya hai",
+                        "tumhara naam kya hai", "aap kaun hain", "नाम", "name"],
+            "response": "मैं एक AI सहायक हूँ जो हिंदी और अंग्रेजी में बात कर सकता हूँ।",
+        },
+        "help": {
+            "phrases": ["मदद", "मदद करो", "मेरी मदद करो", "आप क्या कर सकते हैं", "madad", "madad karo",
+                        "aap kya kar sakte hain", "help"],
+            "response": "मैं सवालों के जवाब दे सकता हूँ और बातचीत कर सकता हूँ। कुछ और पूछिए!",
+        },
+        "thanks": {
+            "phrases": ["धन्यवाद", "शुक्रिया", "बहुत धन्यवाद", "dhanyawad", "shukriya", "thank you"],
+            "response": "आपका स्वागत है! क्या आप कुछ और जानना चाहते हैं?",
+        },
+        "weather": {
+            "phrases": ["मौसम", "mausam", "weather"],
+            "response": "मुझे मौसम की जानकारी नहीं है, लेकिन मैं अन्य सवालों में मदद कर सकता हूँ।",
+            "short_circuit": False,
+        },
+        "time": {
+            "phrases": ["समय", "टाइम", "samay", "time"],
+            "response": "मुझे वर्तमान समय नहीं पता, लेकिन मैं अन्य प्रश्नों का उत्तर दे सकता हूँ।",
+            "short_circuit": False,
+        },
+    },
+}
+
+DEFAULT_RESPONSES = {
+    "en": "That's an interesting question. I'd like to learn more about that. Can you tell me more?",
+    "hi": "यह दिलचस्प सवाल है। मैं इसके बारे में और जानना चाहूँगा। क्या आप कुछ और बता सकते हैं?",
+}
+
+# Words that do not change what the user asked for; ignored when scoring
+FILLER_WORDS = {
+    "en": frozenset({"alexa", "please", "ok", "okay", "so", "um", "uh", "well", "just"}),
+    "hi": frozenset({"alexa", "एलेक्सा", "कृपया", "जी", "ji", "kripya", "please"}),
+}
+
+Phrase = Tuple[Tuple[str, ...], str]
+
+
+class IntentIndex:
+    """
+    Phrase tables compiled once into lookup structures
+
+    Exact utterances are answered from a dict; otherwise candidate phrases are
+    found through an index on their first word and scored by how much of the
+    utterance they cover, so "hello" is a confident greeting while "hello,
+    tell me about black holes" is left to the providers.
+    """
+
+    def __init__(self, tables: Dict[str, Dict[str, dict]] = INTENT_TABLES):
+        self.responses: Dict[str, Dict[str, str]] = {}
+        self.short_circuit: Dict[str, frozenset] = {}
+        self.exact: Dict[str, Dict[str, str]] = {}
+        self.by_first_word: Dict[str, Dict[str, List[Phrase]]] = {}
+        for language, intents in tables.items():
+            self.responses[language] = {name: spec["response"] for name, spec in intents.items()}
+            self.short_circuit[language] = frozenset(
+                name for name, spec in intents.items() if spec.get("short_circuit", True)
+            )
+            exact: Dict[str, str] = {}
+            by_first_word: Dict[str, List[Phrase]] = {}
+            for name, spec in intents.items():
+                for phrase in spec["phrases"]:
+                    words = tuple(normalize_query(phrase).split())
+                    exact.setdefault(" ".join(words), name)
+                    by_first_word.setdefault(words[0], []).append((words, name))
+            self.exact[language] = exact
+            self.by_first_word[language] = by_first_word
+
+    def match(self, user_query: str, language: str) -> Tuple[Optional[str], float]:
+        """
+        Find the best-matching intent for an utterance
+
+        Args:
+            user_query: Raw user query
+            language: Language code from detect_language
+
+        Returns:
+            (intent name, confidence in [0, 1]); (None, 0.0) when nothing matches
+        """
+        if language not in self.exact:
+            language = "en"
+        normalized = normalize_query(user_query)
+        intent = self.exact[language].get(normalized)
+        if intent is not None:
+            return intent, 1.0
+
+        fillers = FILLER_WORDS.get(language, frozenset())
+        words = [word for word in normalized.split() if word not in fillers] or normalized.split()
+        if not words:
+            return None, 0.0
+        stripped = " ".join(words)
+        intent = self.exact[language].get(stripped)
+        if intent is not None:
+            return intent, 1.0
+
+        best, best_score = None, 0.0
+        index = self.by_first_word[language]
+        for start, word in enumerate(words):
+            for phrase, name in index.get(word, ()):
+                if tuple(words[start:start + len(phrase)]) == phrase:
+                    score = len(phrase) / len(words)
+                    if score > best_score:
+                        best, best_score = name, score
+        return best, best_score
+
+    def answer(self, user_query: str, language: str,
+               threshold: float = INTENT_CONFIDENCE_THRESHOLD) -> Optional[str]:
+        """
+        Answer an utterance locally when a short-circuit intent is confident enough
+
+        Args:
+            user_query: Raw user query
+            language: Language code from detect_language
+            threshold: Minimum confidence
+
+        Returns:
+            Localized response, or None if the query should go to a provider
+        """
+        if not LOCAL_INTENTS_ENABLED:
+            return None
+        intent, confidence = self.match(user_query, language)
+        table_language = language if language in self.responses else "en"
+        if intent is None or confidence < threshold or intent not in self.short_circuit[table_language]:
+            return None
+        logger.debug("Local intent '%s' (%.2f) answered without a provider call", intent, confidence)
+        return self.responses[table_language][intent]
+
+    def fallback(self, user_query: str, language: str) -> str:
+        """Best canned response for any matching intent, or the generic default"""
+        table_language = language if language in self.responses else "en"
+        intent, _ = self.match(user_query, table_language)
+        if intent is None:
+            return DEFAULT_RESPONSES[table_language]
+        return self.responses[table_language][intent]
+
+
+intent_index = IntentIndex()
@@ -1,9 +1,147 @@
 import re
+import string
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
+# Indic Unicode blocks are 128 code points each, laid out contiguously from
+# U+0900, so a code point's script is a single table lookup: (cp - 0x0900) >> 7
+INDIC_BLOCK_START = 0x0900
+INDIC_SCRIPT_LANGUAGES = (
+    "hi",  # U+0900 Devanagari (Hindi, also Marathi/Nepali)
+    "bn",  # U+0980 Bengali
+    "pa",  # U+0A00 Gurmukhi (Punjabi)
+    "gu",  # U+0A80 Gujarati
+    "or",  # U+0B00 Oriya
+    "ta",  # U+0B80 Tamil
+    "te",  # U+0C00 Telugu
+    "kn",  # U+0C80 Kannada
+    "ml",  # U+0D00 Malayalam
+)
+INDIC_BLOCK_END = INDIC_BLOCK_START + 128 * len(INDIC_SCRIPT_LANGUAGES)
+_INDIC_CHAR_PATTERN = re.compile(f"[{chr(INDIC_BLOCK_START)}-{chr(INDIC_BLOCK_END - 1)}]")
+
+def _block_bounds(block: int):
+    start = INDIC_BLOCK_START + 128 * block
+    return chr(start), chr(start + 127)
+
+# Per script: a pattern for its own block and one for every other Indic block
+_SCRIPT_PATTERNS = tuple(
+    re.compile("[%s-%s]" % _block_bounds(block)) for block in range(len(INDIC_SCRIPT_LANGUAGES))
+)
+_OTHER_SCRIPT_PATTERNS = tuple(
+    re.compile("[%s]" % "".join(
+        "%s-%s" % _block_bounds(other) for other in range(len(INDIC_SCRIPT_LANGUAGES)) if other != block
+    ))
+    for block in range(len(INDIC_SCRIPT_LANGUAGES))
+)
+
+# Romanized (transliterated) vocabularies: word -> weight. Words that are also
+# common English words get a low weight so they only count alongside others.
+TRANSLITERATED_VOCABULARIES = {
+    "hi": {
+        "namaste": 1.0, "kaise": 1.0, "kya": 1.0, "hai": 1.0, "haan": 1.0, "nahi": 1.0,
+        "aap": 1.0, "main": 0.3, "mera": 1.0, "tera": 0.5, "uska": 1.0, "yahan": 1.0,
+        "wahan": 1.0, "kahan": 1.0, "kab": 1.0, "kyun": 1.0, "achha": 1.0, "theek": 1.0,
+        "dhanyawad": 1.0, "shukriya": 1.0, "alvida": 1.0,
+    },
+}
+# Minimum weighted score for a transliterated vocabulary to win
+TRANSLITERATION_THRESHOLD = 1.0
+
+def _word_alternation(words) -> str:
+    """Regex alternation of words factored into a prefix trie, e.g. k(?:ab|ya)"""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:%s)" % "|".join(branches)
+        return "(?:%s)?" % body if "" in node else body
+
+    return build(trie)
+
+# Multi-pattern matcher: every vocabulary is folded into one word -> [(language, weight)]
+# table, so a single tokenizing pass scores all languages with O(1) lookups per word
+_TRANSLITERATION_INDEX: Dict[str, list] = {}
+for _language, _words in TRANSLITERATED_VOCABULARIES.items():
+    for _word, _weight in _words.items():
+        _TRANSLITERATION_INDEX.setdefault(_word, []).append((_language, _weight))
+# Stripped from both ends of each whitespace-separated token
+_WORD_STRIP_CHARS = string.punctuation + "’‘“”।"
+# Any vocabulary word ending at a word boundary (a letter or digit may not follow). One
+# C-level scan rules out most text before it is tokenized; text without a match cannot score.
+_TRANSLITERATION_PREFILTER = re.compile(r"%s(?![^\W_])" % _word_alternation(_TRANSLITERATION_INDEX))
+
+def score_scripts(text: str) -> Dict[str, int]:
+    """
+    Count characters per Indic script
+    
+    Args:
+        text: User input text
+    
+    Returns:
+        Mapping of language code to number of characters in its script
+    """
+    first = _INDIC_CHAR_PATTERN.search(text)
+    if first is None:
+        return {}
+    block = (ord(first.group()) - INDIC_BLOCK_START) >> 7
+    if not _OTHER_SCRIPT_PATTERNS[block].search(text, first.end()):
+        # Common case: a single script, counted without a Python-level loop
+        return {INDIC_SCRIPT_LANGUAGES[block]: len(_SCRIPT_PATTERNS[block].findall(text))}
+    scores: Dict[str, int] = {}
+    for ch in _INDIC_CHAR_PATTERN.findall(text):
+        language = INDIC_SCRIPT_LANGUAGES[(ord(ch) - INDIC_BLOCK_START) >> 7]
+        scores[language] = scores.get(language, 0) + 1
+    return scores
+
+def script_language(text: str) -> Optional[str]:
+    """
+    Indic language whose script has the most characters in the text
+    
+    Args:
+        text: User input text
+    
+    Returns:
+        Language code, or None when the text has no Indic characters
+    """
+    first = _INDIC_CHAR_PATTERN.search(text)
+    if first is None:
+        return None
+    block = (ord(first.group()) - INDIC_BLOCK_START) >> 7
+    if not _OTHER_SCRIPT_PATTERNS[block].search(text, first.end()):
+        # Common case: a single script wins without counting its characters
+        return INDIC_SCRIPT_LANGUAGES[block]
+    scores = score_scripts(text)
+    return max(scores, key=scores.get)
+
+def score_transliteration(text: str) -> Dict[str, float]:
+    """
+    Score romanized text against each transliterated vocabulary (whole words only)
+    
+    Args:
+        text: User input text
+    
+    Returns:
+        Mapping of language code to weighted word-match score
+    """
+    text = text.lower()
+    if _TRANSLITERATION_PREFILTER.search(text) is None:
+        return {}
+    scores: Dict[str, float] = {}
+    for word in text.split():
+        for language, weight in _TRANSLITERATION_INDEX.get(word.strip(_WORD_STRIP_CHARS), ()):
+            scores[language] = scores.get(language, 0.0) + weight
+    return scores
+
 def detect_language(text: str, locale: str = "en-US") -> str:
     """
     Detect language from text content and locale information
@@ -13,7 +151,7 @@ def detect_language(text: str, locale: str = "en-US") -> str:
         locale: Alexa request locale (e.g., 'en-US', 'hi-IN')
     
     Returns:
-        Language code ('en' or 'hi')
+        Language code ('en', 'hi', or another Indic code when its script is used)
     """
     try:
         # First check locale
@@ -23,32 +161,41 @@ def detect_language(text: str, locale: str = "en-US") -> str:
             elif locale.startswith("en"):
                 return "en"
         
-        # Check for Hindi characters (Devanagari script)
-        if text and re.search(r'[\u0900-\u097F]', text):
-            logger.debug(f"Hindi script detected in text: {text}")
-            return "hi"
+        if not text:
+            return "en"
         
-        # Check for common Hindi transliterated words
-        hindi_transliterated_words = [
-            'namaste', 'kaise', 'kya', 'hai', 'haan', 'nahi', 'aap', 'main', 
-            'mera', 'tera', 'uska', 'yahan', 'wahan', 'kahan', 'kab', 'kyun',
-            'achha', 'theek', 'dhanyawad', 'shukriya', 'alvida'
-        ]
+        # Native script: the script with the most characters wins
+        if not text.isascii():
+            language = script_language(text)
+            if language:
+                return language
         
-        if text:
-            text_lower = text.lower()
-            for word in hindi_transliterated_words:
-                if word in text_lower:
-                    logger.debug(f"Hindi transliterated word '{word}' detected")
-                    return "hi"
+        # Romanized text: best-scoring transliterated vocabulary above the threshold
+        scores = score_transliteration(text)
+        if scores:
+            language = max(scores, key=scores.get)
+            if scores[language] >= TRANSLITERATION_THRESHOLD:
+                return language
         
         # Default to English
         return "en"
         
     except Exception as e:
-        logger.error(f"Error in language detection: {e}")
+        logger.error("Error in language detection: %s", e)
         return "en"  # Default fallback
 
+SYSTEM_PROMPTS = {
+    "en": """You are a helpful and friendly AI assistant for Alexa. 
+Respond naturally and conversationally in English. Keep responses concise and suitable for voice interaction. 
+Be helpful, informative, and engaging. If asked about your capabilities, mention that you can help with 
+questions, provide information, and have conversations in both English and Hindi.""",
+    
+    "hi": """आप Alexa के लिए एक सहायक और मित्रवत AI सहायक हैं। 
+हिंदी में प्राकृतिक और बातचीत के अंदाज में जवाब दें। आवाज़ की बातचीत के लिए उपयुक्त संक्षिप्त उत्तर दें। 
+सहायक, जानकारीपूर्ण और आकर्षक बनें। यदि आपकी क्षमताओं के बारे में पूछा जाए, तो बताएं कि आप 
+सवालों का जवाब दे सकते हैं, जानकारी प्रदान कर सकते हैं, और हिंदी और अंग्रेजी दोनों में बातचीत कर सकते हैं।"""
+}
+
 def get_system_prompt(language: str) -> str:
     """
     Get language-specific system prompt for the AI assistant
@@ -59,19 +206,24 @@ def get_system_prompt(language: str) -> str:
     Returns:
         System prompt string
     """
-    prompts = {
-        "en": """You are a helpful and friendly AI assistant for Alexa. 
-Respond naturally and conversationally in English. Keep responses concise and suitable for voice interaction. 
-Be helpful, informative, and engaging. If asked about your capabilities, mention that you can help with 
-questions, provide information, and have conversations in both English and Hindi.""",
-        
-        "hi": """आप Alexa के लिए एक सहायक और मित्रवत AI सहायक हैं। 
-हिंदी में प्राकृतिक और बातचीत के अंदाज में जवाब दें। आवाज़ की बातचीत के लिए उपयुक्त संक्षिप्त उत्तर दें। 
-सहायक, जानकारीपूर्ण और आकर्षक बनें। यदि आपकी क्षमताओं के बारे में पूछा जाए, तो बताएं कि आप 
-सवालों का जवाब दे सकते हैं, जानकारी प्रदान कर सकते हैं, और हिंदी और अंग्रेजी दोनों में बातचीत कर सकते हैं।"""
+    return SYSTEM_PROMPTS.get(language, SYSTEM_PROMPTS["en"])
+
+ERROR_MESSAGES = {
+    "en": {
+        "service_unavailable": "The AI service is currently unavailable. Please try again later.",
+        "request_error": "Sorry, I couldn't understand your request. Please try again.",
+        "unexpected_error": "An unexpected error occurred. Please try again.",
+        "no_query": "I didn't hear a question. What would you like to know?",
+        "processing_error": "I'm having trouble processing your request right now. Please try again."
+    },
+    "hi": {
+        "service_unavailable": "AI सेवा अभी उपलब्ध नहीं है। कृपया बाद में पुनः प्रयास करें।",
+        "request_error": "माफ़ करें, मैं आपके अनुरोध को समझ नहीं सका। कृपया पुनः प्रयास करें।",
+        "unexpected_error": "एक अप्रत्याशित त्रुटि हुई है। कृपया पुनः प्रयास करें।",
+        "no_query": "मैंने कोई सवाल नहीं सुना। आप क्या जानना चाहते हैं?",
+        "processing_error": "मुझे अभी आपके अनुरोध को संसाधित करने में परेशानी हो रही है। कृपया पुनः प्रयास करें।"
     }
-    
-    return prompts.get(language, prompts["en"])
+}
 
 def get_error_messages(language: str) -> Dict[str, str]:
     """
@@ -83,24 +235,79 @@ def get_error_messages(language: str) -> Dict[str, str]:
     Returns:
         Dictionary of error messages
     """
-    messages = {
-        "en": {
-            "service_unavailable": "The AI service is currently unavailable. Please try again later.",
-            "request_error": "Sorry, I couldn't understand your request. Please try again.",
-            "unexpected_error": "An unexpected error occurred. Please try again.",
-            "no_query": "I didn't hear a question. What would you like to know?",
-            "processing_error": "I'm having trouble processing your request right now. Please try again."
-        },
-        "hi": {
-            "service_unavailable": "AI सेवा अभी उपलब्ध नहीं है। कृपया बाद में पुनः प्रयास करें।",
-            "request_error": "माफ़ करें, मैं आपके अनुरोध को समझ नहीं सका। कृपया पुनः प्रयास करें।",
-            "unexpected_error": "एक अप्रत्याशित त्रुटि हुई है। कृपया पुनः प्रयास करें।",
-            "no_query": "मैंने कोई सवाल नहीं सुना। आप क्या जानना चाहते हैं?",
-            "processing_error": "मुझे अभी आपके अनुरोध को संसाधित करने में परेशानी हो रही है। कृपया पुनः प्रयास करें।"
-        }
-    }
+    return ERROR_MESSAGES.get(language, ERROR_MESSAGES["en"])
+
+def get_voice_length_limit(language: str) -> int:
+    """
+    Get the maximum spoken reply length for a language
+    
+    Args:
+        language: Language code
+    
+    Returns:
+        Maximum number of characters
+    """
+    return 300 if language == "en" else 250  # Hindi might need slightly less
+
+class VoiceStreamAccumulator:
+    """
+    Collects streamed completion text sentence by sentence until the voice
+    length limit is reached, so the caller can stop reading the stream early
+    """
+    
+    sentence_end = re.compile(r'[।.!?]')
+    
+    def __init__(self, language: str):
+        self.language = language
+        self.max_length = get_voice_length_limit(language)
+        self.sentences = []
+        self.length = 0
+        self.pending = ""
+        self.full = False
+    
+    def feed(self, delta: str) -> bool:
+        """
+        Add streamed text
+        
+        Args:
+            delta: Newly received text
+        
+        Returns:
+            True once the voice budget is full and the stream can be closed
+        """
+        if self.full or not delta:
+            return self.full
+        self.pending += delta
+        while True:
+            match = self.sentence_end.search(self.pending)
+            if not match:
+                break
+            sentence = self.pending[:match.end()]
+            self.pending = self.pending[match.end():]
+            if self.length + len(sentence) > self.max_length:
+                if not self.sentences:
+                    # Nothing complete fits: keep this sentence for text() to hard-truncate
+                    self.pending = sentence
+                self.full = True
+                return True
+            self.sentences.append(sentence)
+            self.length += len(sentence)
+        # A partial sentence that already cannot fit will not fit once finished either
+        if self.length + len(self.pending) > self.max_length:
+            self.full = True
+        return self.full
     
-    return messages.get(language, messages["en"])
+    def text(self) -> str:
+        """Spoken reply built from complete sentences (hard-truncated if there are none)"""
+        if self.sentences:
+            if not self.full and self.pending.strip():
+                # Stream ended normally: keep the unterminated tail too
+                return re.sub(r'\s+', ' ', "".join(self.sentences) + self.pending).strip()
+            return re.sub(r'\s+', ' ', "".join(self.sentences)).strip()
+        text = re.sub(r'\s+', ' ', self.pending).strip()
+        if len(text) > self.max_length:
+            text = text[:self.max_length] + "..."
+        return text
 
 def format_response_for_voice(text: str, language: str) -> str:
     """
@@ -120,7 +327,7 @@ def format_response_for_voice(text: str, language: str) -> str:
     text = re.sub(r'\s+', ' ', text.strip())
     
     # Limit length for voice interaction (Alexa has limits)
-    max_length = 300 if language == "en" else 250  # Hindi might need slightly less
+    max_length = get_voice_length_limit(language)
     
     if len(text) > max_length:
         # Try to cut at sentence boundary
@@ -0,0 +1,403 @@
+"""
+On-box CPU inference, the tier between the remote providers and the canned
+fallback replies.
+
+The model is loaded when this module is imported. Under gunicorn's
+preload_app (gunicorn_config.py) that happens once in the master, and the
+read-only memory-mapped weights are shared by every forked worker instead
+of each worker holding its own copy. Generation runs on a small per-worker
+thread pool so the webhook thread only waits up to the turn's deadline, and
+its length is bounded by the spoken reply limit of the language.
+
+Backends (LOCAL_MODEL_BACKEND):
+    bigram     the tiny word-bigram model bundled in models/ (offline testing)
+    llama_cpp  a quantized GGUF instruct model through llama-cpp-python
+"""
+import os
+import logging
+import mmap
+import struct
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import metrics
+from context_builder import ASCII_CHARS_PER_TOKEN, NON_ASCII_TOKENS_PER_CHAR, as_chat_messages
+from language_utils import format_response_for_voice, get_voice_length_limit
+from provider_scheduler import Deadline
+
+logger = logging.getLogger(__name__)
+
+BUNDLED_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "tiny-bigram.bin")
+
+# Empty disables the local tier
+LOCAL_MODEL_BACKEND = os.getenv("LOCAL_MODEL_BACKEND", "").lower()
+LOCAL_MODEL_PATH = os.getenv("LOCAL_MODEL_PATH") or (BUNDLED_MODEL_PATH if LOCAL_MODEL_BACKEND == "bigram" else "")
+# Generations running at once per worker, and how many more may wait for one
+LOCAL_MODEL_WORKERS = int(os.getenv("LOCAL_MODEL_WORKERS", "1"))
+LOCAL_MODEL_MAX_QUEUE = int(os.getenv("LOCAL_MODEL_MAX_QUEUE", "2"))
+# CPU threads used by one llama.cpp generation, and its context window in tokens
+LOCAL_MODEL_CPU_THREADS = int(os.getenv("LOCAL_MODEL_CPU_THREADS", "2"))
+LOCAL_MODEL_CONTEXT = int(os.getenv("LOCAL_MODEL_CONTEXT", "1024"))
+# Below this much remaining time a local generation is not worth starting
+LOCAL_MODEL_MIN_TIME = float(os.getenv("LOCAL_MODEL_MIN_TIME", "0.5"))
+
+
+def max_new_tokens(language: str) -> int:
+    """Tokens needed for the longest reply Alexa should speak in a language"""
+    limit = get_voice_length_limit(language)
+    per_char = 1 / ASCII_CHARS_PER_TOKEN if language == "en" else NON_ASCII_TOKENS_PER_CHAR
+    return int(limit * per_char) + 1
+
+
+# Bigram model file (little-endian):
+#   header    magic, vocabulary size, successors per word, offset of the string
+#             offsets, offset of the successor table
+#   strings   vocab_size + 1 uint32 offsets into the UTF-8 blob that follows;
+#             words are sorted by their UTF-8 bytes so lookups bisect the file
+#   table     vocab_size x fanout uint32 word ids, most frequent successor
+#             first, padded with NO_WORD
+BIGRAM_MAGIC = b"ALXBGRM1"
+_BIGRAM_HEADER = struct.Struct("<8sIIII")
+NO_WORD = 0xFFFFFFFF
+END_TOKEN = "</s>"
+
+
+def start_token(language: str) -> str:
+    return f"<s:{language}>"
+
+
+def write_bigram_model(sentences: Iterable[Tuple[str, str]], path: str, fanout: int = 8) -> int:
+    """
+    Build a bigram model file from (language, sentence) pairs
+
+    Args:
+        sentences: Training sentences with their language codes
+        path: Output file
+        fanout: Successors kept per word
+
+    Returns:
+        Vocabulary size
+    """
+    counts: Dict[str, Dict[str, int]] = {}
+    for language, sentence in sentences:
+        words = [start_token(language)] + sentence.split() + [END_TOKEN]
+        for previous, word in zip(words, words[1:]):
+            successors = counts.setdefault(previous, {})
+            successors[word] = successors.get(word, 0) + 1
+            counts.setdefault(word, {})
+
+    vocab = sorted(counts, key=lambda word: word.encode("utf-8"))
+    ids = {word: index for index, word in enumerate(vocab)}
+    blob = b"".join(word.encode("utf-8") for word in vocab)
+    offsets, position = [], 0
+    for word in vocab:
+        offsets.append(position)
+        position += len(word.encode("utf-8"))
+    offsets.append(position)
+
+    strings_at = _BIGRAM_HEADER.size
+    table_at = strings_at + 4 * len(offsets) + len(blob)
+    table_at += -table_at % 4
+    table = []
+    for word in vocab:
+        ranked = sorted(counts[word].items(), key=lambda item: (-item[1], ids[item[0]]))[:fanout]
+        row = [ids[successor] for successor, _ in ranked]
+        table.extend(row + [NO_WORD] * (fanout - len(row)))
+
+    with open(path, "wb") as f:
+        f.write(_BIGRAM_HEADER.pack(BIGRAM_MAGIC, len(vocab), fanout, strings_at, table_at))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(blob)
+        f.write(b"\0" * (table_at - strings_at - 4 * len(offsets) - len(blob)))
+        f.write(struct.pack(f"<{len(table)}I", *table))
+    return len(vocab)
+
+
+class BigramModel:
+    """
+    Word-bigram model read straight from a memory-mapped file
+
+    Nothing is copied onto the heap: words and successor rows are read from
+    the mapping on demand, so every worker shares the same pages.
+    """
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise RuntimeError("The bigram model format is little-endian")
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.vocab_size, self.fanout, strings_at, table_at = _BIGRAM_HEADER.unpack_from(self._mm)
+        if magic != BIGRAM_MAGIC:
+            raise ValueError(f"{path} is not a bigram model file")
+        view = memoryview(self._mm)
+        self._offsets = view[strings_at:strings_at + 4 * (self.vocab_size + 1)].cast("I")
+        self._blob_at = strings_at + 4 * (self.vocab_size + 1)
+        self._table = view[table_at:table_at + 4 * self.vocab_size * self.fanout].cast("I")
+        self.size = len(self._mm)
+
+    def _word_bytes(self, word_id: int) -> bytes:
+        return self._mm[self._blob_at + self._offsets[word_id]:self._blob_at + self._offsets[word_id + 1]]
+
+    def word(self, word_id: int) -> str:
+        return self._word_bytes(word_id).decode("utf-8")
+
+    def lookup(self, word: str) -> Optional[int]:
+        """Id of a word (bisecting the sorted vocabulary), or None"""
+        key = word.encode("utf-8")
+        low, high = 0, self.vocab_size
+        while low < high:
+            middle = (low + high) // 2
+            if self._word_bytes(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < self.vocab_size and self._word_bytes(low) == key else None
+
+    def successors(self, word_id: int) -> List[int]:
+        row = self._table[word_id * self.fanout:(word_id + 1) * self.fanout]
+        return [successor for successor in row if successor != NO_WORD]
+
+    def generate(self, messages: list, language: str, max_chars: int, stop_at: float) -> str:
+        """
+        Walk the bigram chain from the language's sentence start
+
+        Successors that also occur in the question are taken first (once
+        each); otherwise one of the most frequent few is picked by a hash of
+        the question, so the same question always gets the same answer.
+        """
+        question = messages[-1]["content"] if messages else ""
+        preferred = {word_id for word_id in map(self.lookup, question.split()) if word_id is not None}
+        seed = zlib.crc32(question.encode("utf-8"))
+        current = self.lookup(start_token(language))
+        if current is None:
+            current = self.lookup(start_token("en"))
+        end = self.lookup(END_TOKEN)
+        words, length = [], 0
+        for step in range(max_chars):
+            if current is None or time.monotonic() >= stop_at:
+                break
+            successors = self.successors(current)
+            if not successors:
+                break
+            chosen = next((word_id for word_id in successors if word_id in preferred), None)
+            if chosen is None:
+                chosen = successors[(seed + step) % min(len(successors), 3)]
+            preferred.discard(chosen)
+            if chosen == end:
+                break
+            word = self.word(chosen)
+            if length + len(word) + 1 > max_chars:
+                break
+            words.append(word)
+            length += len(word) + 1
+            current = chosen
+        return " ".join(words)
+
+    def advise(self) -> None:
+        """Ask the kernel to read the file in ahead of the first generation"""
+        if hasattr(self._mm, "madvise"):
+            self._mm.madvise(mmap.MADV_WILLNEED)
+
+
+class LlamaCppModel:
+    """Quantized GGUF instruct model run by llama.cpp, with its weights memory-mapped"""
+
+    def __init__(self, path: str):
+        # Optional dependency, only needed for this backend
+        from llama_cpp import Llama
+
+        self._llama = Llama(
+            model_path=path,
+            n_ctx=LOCAL_MODEL_CONTEXT,
+            n_threads=LOCAL_MODEL_CPU_THREADS,
+            use_mmap=True,
+            verbose=False,
+        )
+        self.size = os.path.getsize(path)
+
+    def generate(self, messages: list, language: str, max_chars: int, stop_at: float) -> str:
+        max_tokens = max_new_tokens(language)
+        prompt = as_chat_messages(messages).fit(LOCAL_MODEL_CONTEXT - max_tokens)
+        # Streamed, so a generation that runs past the deadline (or the voice limit) stops
+        # there instead of holding a pool thread until max_tokens
+        chunks = self._llama.create_chat_completion(
+            messages=list(prompt),
+            max_tokens=max_tokens,
+            temperature=0.7,
+            stream=True,
+        )
+        parts, length = [], 0
+        try:
+            for chunk in chunks:
+                content = chunk["choices"][0]["delta"].get("content") or ""
+                parts.append(content)
+                length += len(content)
+                if length >= max_chars or time.monotonic() >= stop_at:
+                    break
+        finally:
+            chunks.close()
+        return "".join(parts)
+
+    def advise(self) -> None:
+        # llama.cpp maps the file itself; the page cache is shared either way
+        pass
+
+
+BACKENDS = {
+    "bigram": BigramModel,
+    "llama_cpp": LlamaCppModel,
+}
+
+
+class LocalModel:
+    """The loaded model plus the bounded per-worker pool it generates on"""
+
+    def __init__(self, backend: str = LOCAL_MODEL_BACKEND, path: str = LOCAL_MODEL_PATH,
+                 workers: int = LOCAL_MODEL_WORKERS, max_queue: int = LOCAL_MODEL_MAX_QUEUE):
+        self.backend = backend
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.model: Optional[Any] = None
+        self.loaded_by: Optional[int] = None
+        self.load_ms: Optional[float] = None
+        self.generations = 0
+        self.total_latency = 0.0
+        self.outstanding = 0
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if backend:
+            self.load()
+
+    @property
+    def enabled(self) -> bool:
+        return self.model is not None
+
+    def load(self) -> None:
+        """Load (map) the model; on failure the local tier stays disabled"""
+        factory = BACKENDS.get(self.backend)
+        if factory is None:
+            logger.error(f"Unknown LOCAL_MODEL_BACKEND {self.backend!r}; local inference disabled")
+            return
+        start = time.perf_counter()
+        try:
+            self.model = factory(self.path)
+            self.model.advise()
+        except Exception as e:
+            logger.error(f"Could not load local model {self.path!r} ({self.backend}): {e}")
+            self.model = None
+            return
+        self.loaded_by = os.getpid()
+        self.load_ms = round((time.perf_counter() - start) * 1000, 1)
+        logger.info(f"Loaded local {self.backend} model {self.path} in {self.load_ms}ms")
+
+    def _ensure_executor(self) -> ThreadPoolExecutor:
+        # Threads do not survive a fork; each worker starts its own pool on first use
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="local-model")
+                    self.outstanding = 0
+                    self._pid = pid
+        return self._executor
+
+    def _run(self, messages: list, language: str, stop_at: float) -> str:
+        start = time.monotonic()
+        try:
+            text = self.model.generate(messages, language, get_voice_length_limit(language), stop_at)
+        finally:
+            metrics.PROVIDER_DURATION.observe("local", value=time.monotonic() - start)
+            with self._lock:
+                self.outstanding -= 1
+                self.generations += 1
+                self.total_latency += time.monotonic() - start
+        return format_response_for_voice(text, language)
+
+    def submit(self, messages: list, language: str, deadline: Deadline):
+        """
+        Start a generation on the pool
+
+        Returns:
+            A future for the reply, or None when the model is off, the pool
+            is saturated or too little of the deadline is left
+        """
+        if self.model is None:
+            return None
+        if deadline.remaining() < LOCAL_MODEL_MIN_TIME:
+            metrics.LOCAL_GENERATIONS.inc("no_time")
+            return None
+        executor = self._ensure_executor()
+        with self._lock:
+            if self.outstanding >= self.workers + self.max_queue:
+                metrics.LOCAL_GENERATIONS.inc("busy")
+                return None
+            self.outstanding += 1
+        stop_at = time.monotonic() + deadline.remaining()
+        return executor.submit(self._run, messages, language, stop_at)
+
+    def _outcome(self, text: Optional[str]) -> Optional[str]:
+        metrics.LOCAL_GENERATIONS.inc("answered" if text else "empty")
+        return text or None
+
+    def generate(self, messages: list, language: str, deadline: Deadline) -> Optional[str]:
+        """
+        Generate a reply within the turn's deadline
+
+        Args:
+            messages: Chat-completions messages for the turn
+            language: Language code (bounds the reply length)
+            deadline: Deadline for the whole turn
+
+        Returns:
+            The reply formatted for voice, or None
+        """
+        future = self.submit(messages, language, deadline)
+        if future is None:
+            return None
+        try:
+            return self._outcome(future.result(timeout=deadline.remaining()))
+        except FutureTimeoutError:
+            metrics.LOCAL_GENERATIONS.inc("timeout")
+        except Exception as e:
+            logger.error("Local model generation failed: %s", e)
+            metrics.LOCAL_GENERATIONS.inc("error")
+        return None
+
+    async def generate_async(self, messages: list, language: str, deadline: Deadline) -> Optional[str]:
+        """Asyncio counterpart of generate; the event loop is not blocked while the pool generates"""
+        import asyncio  # deferred: sync workers never load it
+
+        future = self.submit(messages, language, deadline)
+        if future is None:
+            return None
+        try:
+            return self._outcome(await asyncio.wait_for(asyncio.wrap_future(future), deadline.remaining()))
+        except asyncio.TimeoutError:
+            metrics.LOCAL_GENERATIONS.inc("timeout")
+        except Exception as e:
+            logger.error("Local model generation failed: %s", e)
+            metrics.LOCAL_GENERATIONS.inc("error")
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend or None,
+            "enabled": self.enabled,
+            "path": self.path or None,
+            "size_bytes": self.model.size if self.model is not None else None,
+            # A pid other than this worker's means the weights were mapped before the fork and are shared
+            "loaded_by_pid": self.loaded_by,
+            "load_ms": self.load_ms,
+            "generations": self.generations,
+            "outstanding": self.outstanding,
+            "avg_latency_ms": round(self.total_latency * 1000 / self.generations, 1) if self.generations else None,
+        }
+
+
+local_model = LocalModel()
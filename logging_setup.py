@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+import threading
+from typing import Any, Dict, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" for structured records, "text" for the classic human-readable format
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Share of sampled (per-request DEBUG/INFO) records that are actually written
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Longest message or field value written before it is truncated
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "512"))
+
+# Pass as extra= on hot-path records that may be sampled away under load
+SAMPLED = {"sampled": True}
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_STANDARD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def truncate(value: str, limit: int = LOG_MAX_FIELD_CHARS) -> str:
+    """Cut long strings, noting how much was dropped"""
+    if len(value) <= limit:
+        return value
+    return f"{value[:limit]}...(+{len(value) - limit} chars)"
+
+
+def redact_payload(payload: Any) -> Dict[str, Any]:
+    """
+    Summarize an Alexa request payload for logging instead of dumping it whole
+
+    Args:
+        payload: Parsed Alexa request JSON
+
+    Returns:
+        Small dict with the fields useful for debugging
+    """
+    if not isinstance(payload, dict):
+        return {"payload": truncate(repr(payload))}
+    request_data = payload.get("request") or {}
+    intent = request_data.get("intent") or {}
+    slots = intent.get("slots") or {}
+    return {
+        "request_type": request_data.get("type"),
+        "intent": intent.get("name"),
+        "locale": request_data.get("locale"),
+        "session_id": (payload.get("session") or {}).get("sessionId"),
+        "slots": {name: truncate(str((slot or {}).get("value")), 120) for name, slot in slots.items()},
+    }
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any extra= fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": truncate(record.getMessage()),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and key != "sampled":
+                entry[key] = value if isinstance(value, (int, float, bool, type(None))) else truncate(str(value))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Drop a share of records marked with extra=SAMPLED (never warnings or errors)"""
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or record.levelno >= logging.WARNING or not getattr(record, "sampled", False):
+            return True
+        return random.random() < self.rate
+
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to a background writer thread without blocking the caller
+
+    Message formatting happens on the writer thread, a full queue drops the
+    record (counted in .dropped) instead of blocking, and the writer thread is
+    restarted in a forked worker, where the parent's thread does not exist.
+    """
+
+    def __init__(self, target: logging.Handler, maxsize: int = LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize))
+        self.target = target
+        self.dropped = 0
+        self._pid: Optional[int] = None
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._start_lock = threading.Lock()
+        self._ensure_listener()
+
+    def _ensure_listener(self) -> None:
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._start_lock:
+            if self._pid == pid:
+                return
+            # Records queued by the parent process never reach this one's writer
+            self.queue = queue.Queue(self.queue.maxsize)
+            self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._pid = pid
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Keep msg/args unformatted; only tracebacks must be rendered here
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self) -> None:
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+
+
+_handler: Optional[BackgroundQueueHandler] = None
+
+
+def configure_logging() -> BackgroundQueueHandler:
+    """
+    Install the non-blocking, sampled logging pipeline on the root logger
+
+    Returns:
+        The queue handler (exposes .dropped)
+    """
+    global _handler
+    if _handler is not None:
+        return _handler
+
+    stream = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+
+    _handler = BackgroundQueueHandler(stream)
+    _handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    atexit.register(_handler.stop)
+    return _handler
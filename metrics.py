@@ -0,0 +1,208 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Recording a sample is a perf_counter() call plus a locked list update, cheap
+enough to leave on in production. Metrics are per process: with several
+gunicorn workers each scrape of /metrics reports the worker that served it.
+"""
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter, optionally labelled"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def advance_to(self, *label_values: str, total: float) -> None:
+        """Catch up with a running total kept elsewhere (read at scrape time); never moves backwards"""
+        with self._lock:
+            self._values[label_values] = max(self._values.get(label_values, 0.0), total)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, values)} {_format_value(v)}" for values, v in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down (set at scrape time for store sizes)"""
+
+    kind = "gauge"
+
+    def set(self, *label_values: str, value: float) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations in seconds"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *label_values: str, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(values, list(series)) for values, series in self._series.items()]
+        lines = []
+        for values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, values, le)} {cumulative}")
+            labels = _format_labels(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]!r}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+_registry: List = []
+
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+
+STAGE_DURATION = _register(Histogram(
+    "alexa_stage_duration_seconds", "Time spent in each stage of an Alexa turn", ["stage"]))
+REQUEST_DURATION = _register(Histogram(
+    "alexa_request_duration_seconds", "End-to-end /alexa handling time"))
+REQUEST_TYPES = _register(Counter(
+    "alexa_requests_total", "Alexa requests by request type (built-in intents by name)", ["type"]))
+PROVIDER_DURATION = _register(Histogram(
+    "alexa_provider_duration_seconds", "Duration of individual provider calls", ["provider"]))
+PROVIDER_ERRORS = _register(Counter(
+    "alexa_provider_errors_total", "Provider calls that failed, by kind", ["provider", "kind"]))
+PROVIDER_TIMEOUTS = _register(Counter(
+    "alexa_provider_timeouts_total", "Provider calls that hit their client-side timeout",
+    ["provider"]))
+PROVIDER_BREAKER_STATE = _register(Gauge(
+    "alexa_provider_breaker_state", "Circuit breaker state per endpoint (0 closed, 1 half-open, 2 open)",
+    ["endpoint"]))
+COALESCED_CALLS = _register(Counter(
+    "alexa_coalesced_calls_total", "Provider calls served by an identical call already in flight", ["provider"]))
+BATCH_SIZE = _register(Histogram(
+    "alexa_provider_batch_size", "Prompts per micro-batched provider request", ["provider"],
+    buckets=(1, 2, 4, 8, 16, 32, 64)))
+LOCAL_GENERATIONS = _register(Counter(
+    "alexa_local_generations_total", "On-box model generations by outcome", ["outcome"]))
+ADMISSION_IN_FLIGHT = _register(Gauge("alexa_admission_in_flight", "Turns currently holding a provider slot"))
+ADMISSION_QUEUE_DEPTH = _register(Gauge("alexa_admission_queue_depth", "Turns waiting for a provider slot"))
+PROVIDER_CALLS_LINGERING = _register(Gauge(
+    "alexa_provider_calls_lingering", "Losing provider calls still running after their turn answered"))
+ADMISSION_SHED = _register(Counter(
+    "alexa_admission_shed_total", "Turns answered with the busy reply instead of calling providers", ["reason"]))
+ADMISSION_WAIT = _register(Histogram("alexa_admission_wait_seconds", "Time turns waited for a provider slot"))
+SESSION_COUNT = _register(Gauge("alexa_sessions", "Live sessions in the session store"))
+SESSION_BYTES = _register(Gauge("alexa_session_store_bytes", "Bytes held by the session store"))
+SESSION_EVICTIONS = _register(Counter(
+    "alexa_session_evictions_total", "Sessions evicted by TTL or memory cap (this process)"))
+CACHE_EVENTS = _register(Counter(
+    "alexa_response_cache_events_total", "Response cache hits, misses and evictions (this process)", ["event"]))
+
+
+# Stage timings of the request being handled, for the Server-Timing header
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def begin_request() -> float:
+    """Start collecting stage timings for the current request; returns the start time"""
+    _request_timings.set([])
+    return time.perf_counter()
+
+
+def end_request(start: float) -> str:
+    """
+    Record the request duration and build its Server-Timing header value
+
+    Args:
+        start: Value returned by begin_request
+
+    Returns:
+        Header value such as 'parse;dur=0.12, providers;dur=812.4, total;dur=815.0'
+    """
+    total = time.perf_counter() - start
+    REQUEST_DURATION.observe(value=total)
+    timings = _request_timings.get() or []
+    _request_timings.set(None)
+    parts = [f"{stage};dur={duration * 1000:.2f}" for stage, duration in timings]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a block as one stage of the current turn"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_DURATION.observe(stage, value=duration)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, duration))
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text format"""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
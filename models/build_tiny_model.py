@@ -0,0 +1,29 @@
+"""
+Build the tiny bigram test model bundled for the local inference tier
+(LOCAL_MODEL_BACKEND=bigram) from models/tiny_corpus.tsv:
+
+    python models/build_tiny_model.py
+
+Each corpus line is "<language code>\t<sentence>". The model only strings
+corpus words together; it exists so the local tier can be exercised offline
+without downloading a real model.
+"""
+import os
+import sys
+
+MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(MODELS_DIR))
+
+from local_inference import BUNDLED_MODEL_PATH, write_bigram_model  # noqa: E402
+
+CORPUS_PATH = os.path.join(MODELS_DIR, "tiny_corpus.tsv")
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [tuple(line.rstrip("\n").split("\t", 1)) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    vocab_size = write_bigram_model(load_corpus(), BUNDLED_MODEL_PATH)
+    print(f"Wrote {BUNDLED_MODEL_PATH}: {vocab_size} words, {os.path.getsize(BUNDLED_MODEL_PATH)} bytes")
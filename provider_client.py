@@ -0,0 +1,364 @@
+import os
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Any, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Pool and retry configuration (per gunicorn worker)
+POOL_CONNECTIONS = int(os.getenv("PROVIDER_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.getenv("PROVIDER_POOL_MAXSIZE", "16"))
+MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "1"))
+RETRY_BACKOFF = float(os.getenv("PROVIDER_RETRY_BACKOFF", "0.2"))
+RETRY_STATUSES = tuple(
+    int(code) for code in os.getenv("PROVIDER_RETRY_STATUSES", "502,503,504").split(",") if code.strip()
+)
+WARMUP_TIMEOUT = float(os.getenv("PROVIDER_WARMUP_TIMEOUT", "5"))
+# Async (ASGI) mode multiplexes many sessions over one pool per event loop
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_PROVIDER_MAX_CONNECTIONS", "200"))
+ASYNC_MAX_KEEPALIVE = int(os.getenv("ASYNC_PROVIDER_MAX_KEEPALIVE", "50"))
+# Statuses that say the endpoint (or its key) is unhealthy, not that the request was bad
+FAILURE_STATUSES = frozenset({401, 403, 408, 429})
+
+# on_result(ok, latency_seconds, status) is called once per request sent
+ResultListener = Callable[[bool, float, Optional[int]], None]
+
+
+def is_failure_status(status: int) -> bool:
+    """Whether a response status counts against the endpoint's health"""
+    return status >= 500 or status in FAILURE_STATUSES
+
+
+def build_retry_policy() -> Retry:
+    """
+    Build the urllib3 retry policy shared by every provider session
+
+    Only connection failures and the configured gateway statuses are retried.
+    Read timeouts are never retried because the provider may already be
+    generating (and billing for) the completion.
+
+    Returns:
+        Configured Retry instance
+    """
+    return Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=0,
+        status=MAX_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+        backoff_factor=RETRY_BACKOFF,
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+
+
+class ProviderClient:
+    """Keep-alive HTTP client for a single AI provider, one pool per process"""
+
+    def __init__(self, name: str, url: str, on_result: Optional[ResultListener] = None):
+        self.name = name
+        self.url = url
+        self.on_result = on_result
+        parts = urlsplit(url)
+        self.origin = f"{parts.scheme}://{parts.netloc}"
+        self._session: Optional[requests.Session] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.warmed = False
+
+    @property
+    def session(self) -> requests.Session:
+        """Return this process's session, rebuilding it after a fork"""
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self._create_session()
+                    self._pid = pid
+                    self.warmed = False
+        return self._session
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=POOL_CONNECTIONS,
+            pool_maxsize=POOL_MAXSIZE,
+            max_retries=build_retry_policy(),
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def post(self, url: Optional[str] = None, **kwargs) -> requests.Response:
+        """
+        POST to the provider through the pooled session
+
+        Args:
+            url: Target URL (defaults to the provider URL)
+            **kwargs: Passed through to requests.Session.post
+
+        Returns:
+            The provider response
+        """
+        start = time.perf_counter()
+        try:
+            response = self.session.post(url or self.url, **kwargs)
+        except requests.Timeout:
+            self.errors += 1
+            metrics.PROVIDER_TIMEOUTS.inc(self.name)
+            self._notify(False, start, None)
+            raise
+        except Exception:
+            self.errors += 1
+            metrics.PROVIDER_ERRORS.inc(self.name, "connection")
+            self._notify(False, start, None)
+            raise
+        finally:
+            self.requests_sent += 1
+            self.total_latency += time.perf_counter() - start
+        if response.status_code >= 400:
+            self.errors += 1
+            metrics.PROVIDER_ERRORS.inc(self.name, f"http_{response.status_code // 100}xx")
+        self._notify(not is_failure_status(response.status_code), start, response.status_code)
+        return response
+
+    def _notify(self, ok: bool, start: float, status: Optional[int]) -> None:
+        if self.on_result is not None:
+            self.on_result(ok, time.perf_counter() - start, status)
+
+    def warm(self, timeout: float = WARMUP_TIMEOUT) -> bool:
+        """
+        Open a keep-alive connection to the provider so the first real
+        request skips DNS, TCP and TLS setup
+
+        Args:
+            timeout: Seconds to wait for the warm-up request
+
+        Returns:
+            True if a connection was established
+        """
+        try:
+            response = self.session.head(self.origin, timeout=timeout, allow_redirects=False)
+            response.close()
+            self.warmed = True
+            logger.debug("Warmed %s connection pool (%s)", self.name, self.origin)
+        except Exception as e:
+            logger.warning("Could not warm %s connection pool: %s", self.name, e)
+            self.warmed = False
+        return self.warmed
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report pool usage for this process
+
+        Returns:
+            Dictionary of request counters and per-host pool state
+        """
+        pools = {}
+        if self._session is not None and self._pid == os.getpid():
+            adapter = self._session.get_adapter(self.url)
+            for key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is None:
+                    continue
+                pools[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                    "connections_opened": pool.num_connections,
+                    "requests": pool.num_requests,
+                    "idle": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0,
+                    "maxsize": POOL_MAXSIZE,
+                }
+        return {
+            "pid": os.getpid(),
+            "warmed": self.warmed,
+            "requests": self.requests_sent,
+            "errors": self.errors,
+            "avg_latency_ms": round(self.total_latency * 1000 / self.requests_sent, 1) if self.requests_sent else None,
+            "pools": pools,
+        }
+
+
+class AsyncProviderClient:
+    """Non-blocking keep-alive client for a single AI provider (httpx, one pool per event loop)"""
+
+    def __init__(self, name: str, url: str, on_result: Optional[ResultListener] = None):
+        self.name = name
+        self.url = url
+        self.on_result = on_result
+        self._client = None
+        self.requests_sent = 0
+        self.errors = 0
+        self.total_latency = 0.0
+
+    @property
+    def client(self):
+        if self._client is None:
+            # httpx is only needed by the ASGI serving mode
+            import httpx
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=ASYNC_MAX_KEEPALIVE,
+                ),
+                transport=httpx.AsyncHTTPTransport(retries=MAX_RETRIES),
+            )
+        return self._client
+
+    async def post(self, url: Optional[str] = None, **kwargs):
+        """
+        POST to the provider through the shared async pool
+
+        Args:
+            url: Target URL (defaults to the provider URL)
+            **kwargs: Passed through to httpx.AsyncClient.post
+
+        Returns:
+            The provider response (httpx.Response)
+        """
+        start = time.perf_counter()
+        try:
+            response = await self.client.post(url or self.url, **kwargs)
+        except Exception as e:
+            self._record_exception(e, start)
+            raise
+        finally:
+            self.requests_sent += 1
+            self.total_latency += time.perf_counter() - start
+        self._record_status(response.status_code, start)
+        return response
+
+    def _record_status(self, status: int, start: float) -> None:
+        if status >= 400:
+            self.errors += 1
+            metrics.PROVIDER_ERRORS.inc(self.name, f"http_{status // 100}xx")
+        if self.on_result is not None:
+            self.on_result(not is_failure_status(status), time.perf_counter() - start, status)
+
+    def _record_exception(self, error: Exception, start: float) -> None:
+        import httpx
+        self.errors += 1
+        if isinstance(error, httpx.TimeoutException):
+            metrics.PROVIDER_TIMEOUTS.inc(self.name)
+        else:
+            metrics.PROVIDER_ERRORS.inc(self.name, "connection")
+        if self.on_result is not None:
+            self.on_result(False, time.perf_counter() - start, None)
+
+    @asynccontextmanager
+    async def stream(self, url: Optional[str] = None, **kwargs):
+        """
+        Stream a POST response from the provider through the shared async pool
+
+        Args:
+            url: Target URL (defaults to the provider URL)
+            **kwargs: Passed through to httpx.AsyncClient.stream
+
+        Yields:
+            The streaming provider response (httpx.Response)
+        """
+        start = time.perf_counter()
+        self.requests_sent += 1
+        recorded = False
+        try:
+            async with self.client.stream("POST", url or self.url, **kwargs) as response:
+                # The outcome is decided by the status line; errors mid-body are not counted twice
+                self._record_status(response.status_code, start)
+                recorded = True
+                yield response
+        except Exception as e:
+            if not recorded:
+                self._record_exception(e, start)
+            raise
+        finally:
+            self.total_latency += time.perf_counter() - start
+
+    async def warm(self, timeout: float = WARMUP_TIMEOUT) -> bool:
+        """Open a keep-alive connection to the provider origin"""
+        parts = urlsplit(self.url)
+        try:
+            await self.client.head(f"{parts.scheme}://{parts.netloc}", timeout=timeout)
+            return True
+        except Exception as e:
+            logger.warning("Could not warm async %s connection pool: %s", self.name, e)
+            return False
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Report request counters for this process"""
+        return {
+            "pid": os.getpid(),
+            "requests": self.requests_sent,
+            "errors": self.errors,
+            "avg_latency_ms": round(self.total_latency * 1000 / self.requests_sent, 1) if self.requests_sent else None,
+            "max_connections": ASYNC_MAX_CONNECTIONS,
+        }
+
+
+_clients: Dict[str, ProviderClient] = {}
+_async_clients: Dict[str, AsyncProviderClient] = {}
+
+
+def get_client(name: str, url: str, on_result: Optional[ResultListener] = None) -> ProviderClient:
+    """
+    Get (or create) the pooled client for a provider endpoint
+
+    Args:
+        name: Endpoint name (e.g. 'openai', 'openai-2', 'huggingface')
+        url: Provider endpoint URL
+        on_result: Called with the outcome of every request (see provider_registry)
+
+    Returns:
+        Shared ProviderClient instance
+    """
+    client = _clients.get(name)
+    if client is None:
+        client = _clients.setdefault(name, ProviderClient(name, url, on_result))
+    return client
+
+
+def get_async_client(name: str, url: str, on_result: Optional[ResultListener] = None) -> AsyncProviderClient:
+    """
+    Get (or create) the non-blocking client for a provider endpoint
+
+    Args:
+        name: Endpoint name (e.g. 'openai', 'openai-2', 'huggingface')
+        url: Provider endpoint URL
+        on_result: Called with the outcome of every request (see provider_registry)
+
+    Returns:
+        Shared AsyncProviderClient instance
+    """
+    client = _async_clients.get(name)
+    if client is None:
+        client = _async_clients.setdefault(name, AsyncProviderClient(name, url, on_result))
+    return client
+
+
+async def close_async_clients() -> None:
+    """Close every async provider pool (ASGI shutdown)"""
+    for client in list(_async_clients.values()):
+        await client.aclose()
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Return pool statistics for every registered provider client"""
+    stats = {name: client.stats() for name, client in _clients.items()}
+    for name, client in _async_clients.items():
+        stats[f"{name}_async"] = client.stats()
+    return stats
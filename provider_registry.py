@@ -0,0 +1,369 @@
+"""
+Registry of provider endpoints with per-endpoint circuit breakers.
+
+A provider (openai, huggingface) can have several endpoints, each a URL plus
+API key. Every endpoint keeps a rolling window of request outcomes; too many
+failures open its circuit breaker so traffic stops going to it. After a
+cooldown the breaker is half-open and lets a single probe request through:
+success closes it, failure opens it again with a longer cooldown.
+
+Endpoints are configured as comma-separated URL|KEY|WEIGHT entries, where
+the key and weight are optional (the key defaults to the provider's
+single-key variable):
+
+    OPENAI_ENDPOINTS="https://api.openai.com/v1/chat/completions|sk-a,https://proxy.internal/v1/chat/completions|sk-b|0.5"
+
+State is per process, like the connection pools.
+"""
+import os
+import random
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+import provider_client
+
+logger = logging.getLogger(__name__)
+
+# Rolling window of outcomes used to decide whether an endpoint is healthy
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_WINDOW_SIZE = int(os.getenv("BREAKER_WINDOW_SIZE", "100"))
+# Open when the window's error rate reaches the threshold (with enough requests) ...
+BREAKER_ERROR_THRESHOLD = float(os.getenv("BREAKER_ERROR_THRESHOLD", "0.5"))
+BREAKER_MIN_REQUESTS = int(os.getenv("BREAKER_MIN_REQUESTS", "5"))
+# ... or after this many failures in a row
+BREAKER_CONSECUTIVE_FAILURES = int(os.getenv("BREAKER_CONSECUTIVE_FAILURES", "3"))
+# Seconds an open breaker waits before a probe; doubled after each failed probe
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "15"))
+BREAKER_MAX_COOLDOWN = float(os.getenv("BREAKER_MAX_COOLDOWN", "300"))
+# A probe that never reported back (abandoned call) frees the slot after this long
+BREAKER_PROBE_TIMEOUT = float(os.getenv("BREAKER_PROBE_TIMEOUT", "10"))
+# Latency assumed for an endpoint with no successful samples yet
+ROUTING_DEFAULT_LATENCY = float(os.getenv("ROUTING_DEFAULT_LATENCY", "1.0"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+BREAKER_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def parse_endpoints(spec: Optional[str], default_url: str, default_key: Optional[str]) -> List[Tuple[str, str, float]]:
+    """
+    Parse an endpoint list from the environment
+
+    Args:
+        spec: Comma-separated URL|KEY|WEIGHT entries, or None/empty
+        default_url: URL used when no spec is given
+        default_key: Key for entries without one
+
+    Returns:
+        (url, key, weight) tuples; entries without any key are dropped
+    """
+    if not spec or not spec.strip():
+        return [(default_url, default_key, 1.0)] if default_key else []
+    endpoints = []
+    for entry in spec.split(","):
+        parts = [part.strip() for part in entry.split("|")]
+        if not parts[0]:
+            continue
+        key = parts[1] if len(parts) > 1 and parts[1] else default_key
+        weight = float(parts[2]) if len(parts) > 2 and parts[2] else 1.0
+        if key:
+            endpoints.append((parts[0], key, weight))
+        else:
+            logger.warning(f"Skipping endpoint {parts[0]}: no API key configured")
+    return endpoints
+
+
+class CircuitBreaker:
+    """Closed / open / half-open state machine over a rolling outcome window"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.cooldown = BREAKER_COOLDOWN
+        self.opened_at = 0.0
+        self.probe_started_at: Optional[float] = None
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        # (timestamp, ok, latency) per request
+        self._window = deque(maxlen=BREAKER_WINDOW_SIZE)
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - BREAKER_WINDOW_SECONDS
+        while self._window and self._window[0][0] < cutoff:
+            self._window.popleft()
+
+    def _refresh(self, now: float) -> None:
+        if self.state == OPEN and now - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self.probe_started_at = None
+
+    def available(self) -> bool:
+        """Whether a request could be sent now (without claiming the probe slot)"""
+        now = time.monotonic()
+        with self._lock:
+            self._refresh(now)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN:
+                return self.probe_started_at is None or now - self.probe_started_at >= BREAKER_PROBE_TIMEOUT
+            return False
+
+    def acquire(self) -> bool:
+        """
+        Claim permission to send a request
+
+        Returns:
+            True if the request may go out; in the half-open state only one
+            caller at a time (the probe) gets True
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._refresh(now)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and (
+                self.probe_started_at is None or now - self.probe_started_at >= BREAKER_PROBE_TIMEOUT
+            ):
+                self.probe_started_at = now
+                return True
+            return False
+
+    def record(self, ok: bool, latency: float) -> None:
+        """Record the outcome of one request and move between states"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._window.append((now, ok, latency))
+            self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+
+            if self.state == HALF_OPEN:
+                if ok:
+                    logger.info("Circuit for %s closed after a successful probe", self.name)
+                    self.state = CLOSED
+                    self.cooldown = BREAKER_COOLDOWN
+                    self._window.clear()
+                    self._window.append((now, ok, latency))
+                else:
+                    self._open(now, min(self.cooldown * 2, BREAKER_MAX_COOLDOWN))
+                return
+
+            if self.state == CLOSED and not ok:
+                failures = sum(1 for _, outcome, _ in self._window if not outcome)
+                error_rate = failures / len(self._window)
+                if self.consecutive_failures >= BREAKER_CONSECUTIVE_FAILURES or (
+                    len(self._window) >= BREAKER_MIN_REQUESTS and error_rate >= BREAKER_ERROR_THRESHOLD
+                ):
+                    self._open(now, BREAKER_COOLDOWN)
+
+    def _open(self, now: float, cooldown: float) -> None:
+        self.state = OPEN
+        self.opened_at = now
+        self.cooldown = cooldown
+        self.probe_started_at = None
+        self.times_opened += 1
+        logger.warning("Circuit for %s opened for %.0fs", self.name, cooldown)
+
+    def window_stats(self) -> Dict[str, Any]:
+        """Request count, error rate and median success latency over the window"""
+        with self._lock:
+            self._trim(time.monotonic())
+            outcomes = list(self._window)
+        failures = sum(1 for _, ok, _ in outcomes if not ok)
+        latencies = sorted(latency for _, ok, latency in outcomes if ok)
+        return {
+            "requests": len(outcomes),
+            "error_rate": failures / len(outcomes) if outcomes else 0.0,
+            "p50_latency": latencies[len(latencies) // 2] if latencies else None,
+        }
+
+
+class Endpoint:
+    """One URL + API key of a provider, with its own pools and circuit breaker"""
+
+    def __init__(self, provider: str, name: str, url: str, api_key: str, weight: float = 1.0):
+        self.provider = provider
+        self.name = name
+        self.url = url
+        self.api_key = api_key
+        self.weight = weight
+        self.breaker = CircuitBreaker(name)
+        self.client = provider_client.get_client(name, url, self.record)
+        self.async_client = provider_client.get_async_client(name, url, self.record)
+
+    def record(self, ok: bool, latency: float, status: Optional[int] = None) -> None:
+        self.breaker.record(ok, latency)
+
+    def score(self) -> float:
+        """Routing weight from health: configured weight x smoothed success rate / typical latency"""
+        window = self.breaker.window_stats()
+        failures = round(window["error_rate"] * window["requests"])
+        success_rate = (window["requests"] - failures + 1) / (window["requests"] + 2)
+        latency = window["p50_latency"] or ROUTING_DEFAULT_LATENCY
+        return self.weight * success_rate / max(latency, 0.05)
+
+    def health(self) -> Dict[str, Any]:
+        """Live state for /health (never includes the key)"""
+        window = self.breaker.window_stats()
+        state = self.breaker.state
+        health = {
+            "provider": self.provider,
+            "url": self.url,
+            "weight": self.weight,
+            "state": state,
+            "requests_in_window": window["requests"],
+            "error_rate": round(window["error_rate"], 3),
+            "p50_latency_ms": round(window["p50_latency"] * 1000, 1) if window["p50_latency"] else None,
+            "times_opened": self.breaker.times_opened,
+        }
+        if state == OPEN:
+            remaining = self.breaker.cooldown - (time.monotonic() - self.breaker.opened_at)
+            health["probe_in_s"] = round(max(0.0, remaining), 1)
+        return health
+
+
+def _weighted_order(endpoints: List[Endpoint]) -> List[Endpoint]:
+    """Order endpoints by weighted random sampling without replacement on their scores"""
+    scored = [(endpoint, endpoint.score()) for endpoint in endpoints]
+    ordered = []
+    while scored:
+        total = sum(score for _, score in scored)
+        pick = random.uniform(0, total)
+        for index, (endpoint, score) in enumerate(scored):
+            pick -= score
+            if pick <= 0 or index == len(scored) - 1:
+                ordered.append(endpoint)
+                del scored[index]
+                break
+    return ordered
+
+
+class ProviderRegistry:
+    """Provider endpoints in priority order, routed by live health"""
+
+    def __init__(self):
+        self.providers: Dict[str, List[Endpoint]] = {}
+
+    def register(self, provider: str, endpoints: List[Tuple[str, str, float]]) -> List[Endpoint]:
+        """
+        Register a provider's endpoints (providers keep registration order as priority)
+
+        Args:
+            provider: Provider name, e.g. 'openai'
+            endpoints: (url, key, weight) tuples from parse_endpoints
+
+        Returns:
+            The created endpoints
+        """
+        created = []
+        for index, (url, key, weight) in enumerate(endpoints):
+            # The first endpoint keeps the plain provider name so existing metrics labels stay put
+            name = provider if index == 0 else f"{provider}-{index + 1}"
+            created.append(Endpoint(provider, name, url, key, weight))
+        self.providers[provider] = created
+        return created
+
+    def configured(self, provider: Optional[str] = None) -> bool:
+        """Whether any endpoint (of the given provider) is registered"""
+        if provider is not None:
+            return bool(self.providers.get(provider))
+        return any(self.providers.values())
+
+    def endpoints(self) -> List[Endpoint]:
+        return [endpoint for endpoints in self.providers.values() for endpoint in endpoints]
+
+    def primary(self, provider: str) -> Optional[Endpoint]:
+        """Best endpoint of one provider right now (first configured if none is available)"""
+        endpoints = self.providers.get(provider)
+        if not endpoints:
+            return None
+        routed = self.route([provider])
+        return routed[0] if routed else endpoints[0]
+
+    def route(self, providers: Optional[List[str]] = None) -> List[Endpoint]:
+        """
+        Endpoints to try for one turn, best first
+
+        A half-open endpoint due for its probe goes first: that is one request
+        per cooldown, and the scheduler hedges it with the next endpoint if it
+        is slow. Healthy endpoints follow in provider priority order, in
+        health-weighted random order within each provider; open endpoints are
+        left out.
+
+        Args:
+            providers: Provider names to consider (default: all, in priority order)
+
+        Returns:
+            Ordered endpoints
+        """
+        probes, healthy = [], []
+        for provider in providers or list(self.providers):
+            available = [endpoint for endpoint in self.providers.get(provider, ()) if endpoint.breaker.available()]
+            probes.extend(endpoint for endpoint in available if endpoint.breaker.state == HALF_OPEN)
+            healthy.extend(_weighted_order([endpoint for endpoint in available if endpoint.breaker.state == CLOSED]))
+        return probes + healthy
+
+    def chain(self, query_fns: Dict[str, Callable], async_mode: bool = False) -> List[Tuple[str, Callable]]:
+        """
+        Build the (name, fn) list for provider_scheduler from the current routing
+
+        Args:
+            query_fns: provider name -> fn(messages, timeout, endpoint=...)
+            async_mode: Whether the fns are coroutine functions
+
+        Returns:
+            (endpoint name, fn(messages, timeout)) pairs; a call whose breaker
+            refuses it at start time returns None so the scheduler moves on
+        """
+        chain = []
+        for endpoint in self.route([provider for provider in self.providers if provider in query_fns]):
+            fn = query_fns[endpoint.provider]
+            chain.append((endpoint.name, _guard_async(endpoint, fn) if async_mode else _guard(endpoint, fn)))
+        return chain
+
+    def status(self, provider: str) -> str:
+        """Summary state of a provider for /health"""
+        endpoints = self.providers.get(provider)
+        if not endpoints:
+            return "disconnected"
+        states = {endpoint.breaker.state for endpoint in endpoints}
+        if states == {CLOSED}:
+            return "connected"
+        if CLOSED in states:
+            return "degraded"
+        return "circuit_open"
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        return {endpoint.name: endpoint.health() for endpoint in self.endpoints()}
+
+    def update_metrics(self) -> None:
+        """Publish breaker states as gauges (called at scrape time)"""
+        for endpoint in self.endpoints():
+            endpoint.breaker.available()  # move open -> half-open if the cooldown is over
+            metrics.PROVIDER_BREAKER_STATE.set(endpoint.name, value=BREAKER_STATE_VALUES[endpoint.breaker.state])
+
+
+def _guard(endpoint: Endpoint, fn: Callable) -> Callable:
+    def call(messages, timeout):
+        if not endpoint.breaker.acquire():
+            logger.debug("Circuit for %s is open; skipping", endpoint.name)
+            return None
+        return fn(messages, timeout, endpoint=endpoint)
+    return call
+
+
+def _guard_async(endpoint: Endpoint, fn: Callable) -> Callable:
+    async def call(messages, timeout):
+        if not endpoint.breaker.acquire():
+            logger.debug("Circuit for %s is open; skipping", endpoint.name)
+            return None
+        return await fn(messages, timeout, endpoint=endpoint)
+    return call
+
+
+registry = ProviderRegistry()
@@ -0,0 +1,322 @@
+import os
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Alexa gives a skill roughly 8 seconds to answer; keep a margin for rendering
+ALEXA_RESPONSE_BUDGET = float(os.getenv("ALEXA_RESPONSE_BUDGET", "7.5"))
+# Below this much remaining time a provider call is not worth starting
+MIN_PROVIDER_TIME = float(os.getenv("MIN_PROVIDER_TIME", "0.3"))
+# Start the next provider once the current one exceeds this latency percentile
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.9"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "1.5"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.25"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# A call with another provider behind it gives up this long after it would be hedged,
+# so a blocking loser does not hold its pool thread to the deadline
+HEDGE_TIMEOUT_MARGIN = float(os.getenv("HEDGE_TIMEOUT_MARGIN", "2.0"))
+LATENCY_WINDOW = int(os.getenv("HEDGE_LATENCY_WINDOW", "200"))
+# Threads for sync provider calls; 0 leaves the size to configure_executor (app.py sizes
+# it from the admission limit and the number of endpoints)
+SCHEDULER_MAX_WORKERS = int(os.getenv("SCHEDULER_MAX_WORKERS", "0"))
+
+ProviderFn = Callable[[list, float], Optional[str]]
+AsyncProviderFn = Callable[[list, float], Awaitable[Optional[str]]]
+
+
+class Deadline:
+    """Absolute deadline for one Alexa turn, measured from request arrival"""
+
+    def __init__(self, budget: float = ALEXA_RESPONSE_BUDGET, start: Optional[float] = None):
+        self.start = time.monotonic() if start is None else start
+        self.expires_at = self.start + budget
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        """Seconds since the turn started"""
+        return time.monotonic() - self.start
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for one provider"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        Get a latency percentile over the window
+
+        Args:
+            p: Percentile as a fraction (e.g. 0.9)
+
+        Returns:
+            Latency in seconds, or None when there are too few samples
+        """
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(p * len(ordered)))
+        return ordered[index]
+
+    def hedge_delay(self) -> float:
+        """Time to wait on this provider before starting the next one"""
+        value = self.percentile(HEDGE_PERCENTILE)
+        if value is None:
+            return HEDGE_DEFAULT_DELAY
+        return max(HEDGE_MIN_DELAY, value)
+
+
+_executor = ThreadPoolExecutor(max_workers=SCHEDULER_MAX_WORKERS or 32, thread_name_prefix="provider")
+_trackers: Dict[str, LatencyTracker] = {}
+# Calls still running after the race that started them has returned
+_lingering = 0
+_lingering_lock = threading.Lock()
+
+
+def configure_executor(max_workers: int) -> int:
+    """
+    Size the pool sync provider calls run on (SCHEDULER_MAX_WORKERS wins when set)
+
+    Args:
+        max_workers: Threads needed so admitted turns never wait for one
+
+    Returns:
+        The pool size in effect
+    """
+    global _executor
+    size = SCHEDULER_MAX_WORKERS or max(1, max_workers)
+    _executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="provider")
+    return size
+
+
+def lingering_calls() -> int:
+    """Losing calls still holding a pool thread after their race returned"""
+    return _lingering
+
+
+def _linger(future: Future) -> None:
+    """Count a call that outlives its race until it finishes"""
+    global _lingering
+    with _lingering_lock:
+        _lingering += 1
+    future.add_done_callback(_linger_done)
+
+
+def _linger_done(_future: Future) -> None:
+    global _lingering
+    with _lingering_lock:
+        _lingering -= 1
+
+
+def get_tracker(name: str) -> LatencyTracker:
+    """Get (or create) the latency tracker for a provider"""
+    tracker = _trackers.get(name)
+    if tracker is None:
+        tracker = _trackers.setdefault(name, LatencyTracker())
+    return tracker
+
+
+# Set once the race the current provider call belongs to is over (won by another call or out of time)
+_race_over: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("race_over", default=None)
+
+
+def call_cancelled() -> bool:
+    """
+    Whether the provider call running in this thread has lost its race
+
+    Calls that keep reading after they started (streams) check this and
+    stop, instead of holding an executor thread until their timeout.
+    """
+    race_over = _race_over.get()
+    return race_over is not None and race_over.is_set()
+
+
+def _timed_call(name: str, fn: ProviderFn, messages: list, timeout: float,
+                race_over: Optional[threading.Event] = None) -> Optional[str]:
+    start = time.monotonic()
+    token = _race_over.set(race_over)
+    try:
+        result = fn(messages, timeout)
+    finally:
+        _race_over.reset(token)
+        metrics.PROVIDER_DURATION.observe(name, value=time.monotonic() - start)
+    if result:
+        get_tracker(name).record(time.monotonic() - start)
+    return result
+
+
+def race_providers(providers: Sequence[Tuple[str, ProviderFn]], messages: list,
+                   deadline: Deadline) -> Optional[str]:
+    """
+    Run providers in priority order, hedging with the next one when the
+    current call runs past its adaptive latency percentile
+
+    The first non-empty answer wins; calls that have not started yet are
+    cancelled, and calls already in flight see call_cancelled() turn true.
+    A blocking request cannot check it, so every call but the last in the
+    chain is started with a timeout of its hedge delay plus
+    HEDGE_TIMEOUT_MARGIN; the last one is bounded by the deadline.
+
+    Args:
+        providers: (name, fn) pairs in priority order; fn(messages, timeout)
+        messages: Chat-completions messages for the turn
+        deadline: Deadline for the whole turn
+
+    Returns:
+        The winning reply, or None if no provider answered in time
+    """
+    pending = {}
+    queue: List[Tuple[str, ProviderFn]] = list(providers)
+    race_over = threading.Event()
+
+    def launch_next() -> bool:
+        remaining = deadline.remaining()
+        if not queue or remaining < MIN_PROVIDER_TIME:
+            return False
+        name, fn = queue.pop(0)
+        timeout = remaining
+        if queue:
+            timeout = min(remaining, get_tracker(name).hedge_delay() + HEDGE_TIMEOUT_MARGIN)
+        future = _executor.submit(_timed_call, name, fn, messages, timeout, race_over)
+        pending[future] = name
+        return True
+
+    try:
+        if not queue:
+            return None
+        if not launch_next():
+            logger.warning("Deadline nearly exhausted; skipping provider calls")
+            return None
+
+        while pending:
+            # Wait for the most recent call's hedge delay, or until the deadline
+            newest = list(pending.values())[-1]
+            hedge_at = get_tracker(newest).hedge_delay() if queue else deadline.remaining()
+            done, _ = wait(list(pending), timeout=min(hedge_at, deadline.remaining()), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error("Provider %s raised: %s", name, e)
+                    result = None
+                if result:
+                    logger.debug("Provider %s won after %.3fs", name, deadline.elapsed())
+                    return result
+                logger.info("Provider %s returned no answer; trying next", name)
+
+            if deadline.remaining() <= 0:
+                logger.warning("Deadline reached with %d provider call(s) in flight", len(pending))
+                for name in pending.values():
+                    metrics.PROVIDER_ERRORS.inc(name, "deadline")
+                return None
+
+            # Hedge: the current call either failed or is slower than usual
+            if queue:
+                launch_next()
+        return None
+    finally:
+        race_over.set()
+        for future in pending:
+            if not future.cancel():
+                _linger(future)
+
+
+async def _timed_call_async(name: str, fn: AsyncProviderFn, messages: list, timeout: float) -> Optional[str]:
+    start = time.monotonic()
+    try:
+        result = await fn(messages, timeout)
+    finally:
+        metrics.PROVIDER_DURATION.observe(name, value=time.monotonic() - start)
+    if result:
+        get_tracker(name).record(time.monotonic() - start)
+    return result
+
+
+async def race_providers_async(providers: Sequence[Tuple[str, AsyncProviderFn]], messages: list,
+                               deadline: Deadline) -> Optional[str]:
+    """
+    Asyncio counterpart of race_providers for the ASGI serving mode
+
+    Same hedging policy and latency trackers, but losing calls are cancelled
+    outright instead of being left to run out their timeout.
+
+    Args:
+        providers: (name, coroutine fn) pairs in priority order
+        messages: Chat-completions messages for the turn
+        deadline: Deadline for the whole turn
+
+    Returns:
+        The winning reply, or None if no provider answered in time
+    """
+    # asyncio is only needed by the ASGI serving mode; keep it out of the sync worker's start-up
+    import asyncio
+
+    pending = {}
+    queue: List[Tuple[str, AsyncProviderFn]] = list(providers)
+    if not queue:
+        return None
+
+    def launch_next() -> bool:
+        remaining = deadline.remaining()
+        if not queue or remaining < MIN_PROVIDER_TIME:
+            return False
+        name, fn = queue.pop(0)
+        task = asyncio.ensure_future(_timed_call_async(name, fn, messages, remaining))
+        pending[task] = name
+        return True
+
+    try:
+        if not launch_next():
+            logger.warning("Deadline nearly exhausted; skipping provider calls")
+            return None
+
+        while pending:
+            newest = list(pending.values())[-1]
+            hedge_at = get_tracker(newest).hedge_delay() if queue else deadline.remaining()
+            done, _ = await asyncio.wait(list(pending), timeout=min(hedge_at, deadline.remaining()),
+                                         return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                name = pending.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    logger.error("Provider %s raised: %s", name, e)
+                    result = None
+                if result:
+                    logger.debug("Provider %s won after %.3fs", name, deadline.elapsed())
+                    return result
+                logger.info("Provider %s returned no answer; trying next", name)
+
+            if deadline.remaining() <= 0:
+                logger.warning("Deadline reached with %d provider call(s) in flight", len(pending))
+                for name in pending.values():
+                    metrics.PROVIDER_ERRORS.inc(name, "deadline")
+                return None
+
+            if queue:
+                launch_next()
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
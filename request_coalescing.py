@@ -0,0 +1,199 @@
+"""
+Single-flight coalescing and micro-batching of provider calls.
+
+SingleFlight lets concurrent callers with the same key share one in-flight
+call: the first caller runs it and the others wait for its result.
+MicroBatcher collects prompts for a few milliseconds and hands them to a
+send function as one batch (the HuggingFace Inference API accepts a list of
+inputs), then gives every caller its own result.
+
+Both are per process, like the connection pools.
+"""
+import os
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+HF_COALESCE_ENABLED = os.getenv("HF_COALESCE_ENABLED", "true").lower() == "true"
+HF_BATCH_ENABLED = os.getenv("HF_BATCH_ENABLED", "false").lower() == "true"
+# How long the first prompt of a batch waits for company, and the largest batch sent
+HF_BATCH_WINDOW_MS = float(os.getenv("HF_BATCH_WINDOW_MS", "5"))
+HF_BATCH_MAX_SIZE = int(os.getenv("HF_BATCH_MAX_SIZE", "8"))
+# Batches in flight at once per endpoint (collection continues while they run)
+HF_BATCH_CONCURRENCY = int(os.getenv("HF_BATCH_CONCURRENCY", "4"))
+
+# send(prompts, timeout) -> one result per prompt (None for failures)
+BatchSendFn = Callable[[List[str], float], List[Optional[Any]]]
+
+
+class SingleFlight:
+    """Share one in-flight call between concurrent callers with the same key"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._async_calls: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: float) -> Any:
+        """
+        Run fn, or wait for the identical call already in flight
+
+        Args:
+            key: Identity of the call (e.g. the prompt)
+            fn: Zero-argument callable doing the work
+            timeout: Longest a follower waits for the leader's result
+
+        Returns:
+            fn's result (None for a follower that timed out)
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            metrics.COALESCED_CALLS.inc(self.name)
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeoutError:
+                return None
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]], timeout: float) -> Any:
+        """
+        Asyncio counterpart of do for the ASGI serving mode
+
+        The call runs as its own task, so the leader being cancelled (it lost
+        a hedge race) does not cancel the followers' result.
+        """
+        import asyncio  # deferred: sync workers never load it
+
+        task = self._async_calls.get(key)
+        if task is None:
+            task = self._async_calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._async_calls.pop(key, None))
+        else:
+            metrics.COALESCED_CALLS.inc(self.name)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class MicroBatcher:
+    """
+    Collect prompts over a short window and send them as one batch
+
+    A collector thread waits for the first prompt, keeps collecting until
+    the window closes or the batch is full, then hands the batch to a small
+    executor so collection of the next batch continues while it is in flight.
+    """
+
+    def __init__(self, name: str, send: BatchSendFn, window_ms: float = HF_BATCH_WINDOW_MS,
+                 max_size: int = HF_BATCH_MAX_SIZE, concurrency: int = HF_BATCH_CONCURRENCY):
+        self.name = name
+        self.send = send
+        self.window = window_ms / 1000
+        self.max_size = max(1, max_size)
+        self.concurrency = concurrency
+        # (prompt, timeout, future)
+        self._pending: List[Tuple[str, float, Future]] = []
+        self._cond = threading.Condition()
+        self._pid: Optional[int] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _ensure_collector(self) -> None:
+        # Threads do not survive a fork; start them in each worker on first use
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._cond:
+            if self._pid == pid:
+                return
+            self._pending = []
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"{self.name}-batch")
+            threading.Thread(target=self._collect, name=f"{self.name}-batcher", daemon=True).start()
+            self._pid = pid
+
+    def submit(self, prompt: str, timeout: float) -> Future:
+        """
+        Queue a prompt for the next batch
+
+        Args:
+            prompt: Model input
+            timeout: Request timeout this caller can afford
+
+        Returns:
+            Future resolving to the result for this prompt
+        """
+        self._ensure_collector()
+        future: Future = Future()
+        with self._cond:
+            self._pending.append((prompt, timeout, future))
+            self._cond.notify()
+        return future
+
+    def call(self, prompt: str, timeout: float) -> Optional[Any]:
+        """Submit a prompt and wait for its result (None on timeout)"""
+        try:
+            return self.submit(prompt, timeout).result(timeout=timeout)
+        except FutureTimeoutError:
+            return None
+
+    async def call_async(self, prompt: str, timeout: float) -> Optional[Any]:
+        """Asyncio counterpart of call; the batch itself is sent from the batcher's threads"""
+        import asyncio  # deferred: sync workers never load it
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(self.submit(prompt, timeout)), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def _collect(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                closes_at = time.monotonic() + self.window
+                while len(self._pending) < self.max_size:
+                    remaining = closes_at - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_size]
+                del self._pending[:self.max_size]
+            self._executor.submit(self._send_batch, batch)
+
+    def _send_batch(self, batch: List[Tuple[str, float, Future]]) -> None:
+        metrics.BATCH_SIZE.observe(self.name, value=len(batch))
+        prompts = [prompt for prompt, _, _ in batch]
+        # The slowest caller's budget bounds the request; faster callers stop waiting on their own
+        timeout = max(timeout for _, timeout, _ in batch)
+        try:
+            results = self.send(prompts, timeout)
+        except Exception as e:
+            logger.error("Batch of %d to %s failed: %s", len(batch), self.name, e)
+            results = [None] * len(batch)
+        if len(results) != len(batch):
+            logger.error("%s returned %d results for a batch of %d", self.name, len(results), len(batch))
+            results = [None] * len(batch)
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
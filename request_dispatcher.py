@@ -0,0 +1,100 @@
+"""
+Dispatch Alexa request types that never need a provider call.
+
+LaunchRequest, SessionEndedRequest and Amazon's built-in intents (stop,
+cancel, help, fallback) are answered from replies built once at import, in
+the language of the request locale. SessionEndedRequest and stop/cancel
+release the session's stored history. Everything else is a regular
+IntentRequest and goes through the normal turn.
+"""
+import logging
+from typing import Dict, Optional, Tuple
+
+import metrics
+from alexa_format import AlexaReply, AlexaRequest
+from language_utils import detect_language
+from session_store import session_store
+
+logger = logging.getLogger(__name__)
+
+BUILTIN_MESSAGES = {
+    "en": {
+        "launch": "Hello! I can answer your questions in English and Hindi. What would you like to know?",
+        "help": "You can ask me anything, in English or Hindi. For example, ask me to explain a topic "
+                "or tell you a fun fact. What would you like to know?",
+        "stop": "Goodbye!",
+        "fallback": "Sorry, I didn't catch that. What would you like to know?",
+    },
+    "hi": {
+        "launch": "नमस्ते! मैं हिंदी और अंग्रेजी में आपके सवालों के जवाब दे सकता हूँ। आप क्या जानना चाहते हैं?",
+        "help": "आप मुझसे हिंदी या अंग्रेजी में कुछ भी पूछ सकते हैं। जैसे किसी विषय के बारे में समझाने "
+                "या कोई रोचक तथ्य बताने को कहिए। आप क्या जानना चाहते हैं?",
+        "stop": "अलविदा!",
+        "fallback": "माफ़ कीजिए, मैं समझ नहीं पाया। आप क्या जानना चाहते हैं?",
+    },
+}
+
+# Built-in intent -> (message, release the session's history)
+BUILTIN_INTENTS = {
+    "AMAZON.StopIntent": ("stop", True),
+    "AMAZON.CancelIntent": ("stop", True),
+    "AMAZON.HelpIntent": ("help", False),
+    "AMAZON.FallbackIntent": ("fallback", False),
+    "AMAZON.NavigateHomeIntent": ("launch", False),
+}
+
+# (message, language) -> reply, built once; only "stop" ends the session
+BUILTIN_REPLIES: Dict[Tuple[str, str], AlexaReply] = {
+    (key, language): (text, language, key == "stop")
+    for language, messages in BUILTIN_MESSAGES.items()
+    for key, text in messages.items()
+}
+
+# Alexa ignores any speech sent back for SessionEndedRequest
+SESSION_ENDED_REPLY: AlexaReply = (None, "en", True)
+
+
+def builtin_reply(key: str, locale: str) -> AlexaReply:
+    """Prebuilt reply for a built-in message in the locale's language"""
+    language = detect_language("", locale)
+    return BUILTIN_REPLIES.get((key, language)) or BUILTIN_REPLIES[(key, "en")]
+
+
+def dispatch(alexa_request: AlexaRequest) -> Optional[AlexaReply]:
+    """
+    Answer request types that need no provider call
+
+    Args:
+        alexa_request: Parsed Alexa request (see alexa_format.parse_request)
+
+    Returns:
+        The reply, or None when the request is a regular IntentRequest
+    """
+    request_type = alexa_request.request_type
+    session_id = alexa_request.session_id
+    locale = alexa_request.locale
+
+    if request_type == "IntentRequest":
+        intent_name = alexa_request.intent_name
+        builtin = BUILTIN_INTENTS.get(intent_name)
+        if builtin is None:
+            metrics.REQUEST_TYPES.inc(request_type)
+            return None
+        key, release = builtin
+        metrics.REQUEST_TYPES.inc(intent_name)
+        if release:
+            session_store.delete(session_id)
+        return builtin_reply(key, locale)
+
+    metrics.REQUEST_TYPES.inc(request_type)
+    if request_type == "LaunchRequest":
+        return builtin_reply("launch", locale)
+    if request_type == "SessionEndedRequest":
+        if alexa_request.reason == "ERROR":
+            logger.warning("Session %s ended with error: %s", session_id, alexa_request.error)
+        session_store.delete(session_id)
+        return SESSION_ENDED_REPLY
+
+    # Display, audio player and other events this skill does not handle
+    logger.info("Ignoring Alexa request type %s", request_type)
+    return SESSION_ENDED_REPLY
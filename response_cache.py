@@ -0,0 +1,170 @@
+import os
+import re
+import sys
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+# Comma-separated language codes that always go to the providers (e.g. "hi")
+RESPONSE_CACHE_BYPASS_LANGUAGES = frozenset(
+    code.strip() for code in os.getenv("RESPONSE_CACHE_BYPASS_LANGUAGES", "").split(",") if code.strip()
+)
+
+# Punctuation (including the Devanagari danda) and runs of whitespace collapse to one space.
+# Vowel signs are deliberately not touched, so Hindi words stay intact.
+_NORMALIZE_PATTERN = re.compile(r"[\s.,!?।॥\"'’‘:;\-]+")
+
+CacheKey = Tuple[str, str, str]
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize a user utterance for cache lookups
+
+    Args:
+        text: Raw user query
+
+    Returns:
+        Case-folded text with punctuation and extra whitespace removed
+    """
+    return _NORMALIZE_PATTERN.sub(" ", text.casefold()).strip()
+
+
+def fingerprint_history(messages: Iterable[Dict[str, str]]) -> str:
+    """
+    Fingerprint the history window of a chat-completions messages array
+
+    The system prompt and the final user message are excluded: the former is
+    determined by the language and the latter by the normalized query, both
+    of which are already part of the cache key.
+
+    Args:
+        messages: Output of build_chat_messages_from_history
+
+    Returns:
+        Short hex digest ('' when there is no prior history)
+    """
+    turns = [m for m in messages if m.get("role") in ("user", "assistant")][:-1]
+    if not turns:
+        return ""
+    digest = hashlib.blake2b(digest_size=8)
+    for m in turns:
+        digest.update(m["role"].encode())
+        digest.update(b"\x00")
+        digest.update(m["content"].encode("utf-8"))
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+def make_key(language: str, user_query: str, messages: Iterable[Dict[str, str]]) -> Optional[CacheKey]:
+    """
+    Build the cache key for a turn
+
+    Args:
+        language: Result of detect_language
+        user_query: Raw user query
+        messages: Chat-completions messages for the turn
+
+    Returns:
+        Cache key, or None when caching is disabled for this language
+    """
+    if not RESPONSE_CACHE_ENABLED or language in RESPONSE_CACHE_BYPASS_LANGUAGES:
+        return None
+    return (language, normalize_query(user_query), fingerprint_history(messages))
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with TTL expiry and entry/byte bounds"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[CacheKey, Tuple[str, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bypasses = 0
+
+    @staticmethod
+    def _entry_size(key: CacheKey, value: str) -> int:
+        return sys.getsizeof(value) + sum(sys.getsizeof(part) for part in key)
+
+    def get(self, key: Optional[CacheKey]) -> Optional[str]:
+        """Return the cached reply for key, or None on a miss"""
+        if key is None:
+            self.bypasses += 1
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, size = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Optional[CacheKey], value: str) -> None:
+        """Store a reply, evicting least-recently-used entries to stay within bounds"""
+        if key is None or not value:
+            return
+        size = self._entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Report size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": RESPONSE_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "bypasses": self.bypasses,
+            "bypass_languages": sorted(RESPONSE_CACHE_BYPASS_LANGUAGES),
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from contextlib import closing
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# "sqlite" shares sessions across gunicorn workers; "memory" is per-process
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "sqlite").lower()
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", os.path.join(tempfile.gettempdir(), "alexa_sessions.db"))
+# Ring buffer size: only the most recent turns are kept per session (the prompt
+# builder then packs as many of them as fit each provider's token budget)
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "8"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "900"))
+SESSION_STORE_MAX_BYTES = int(os.getenv("SESSION_STORE_MAX_BYTES", str(16 * 1024 * 1024)))
+# Workers memory-map the shared database file up to this size
+SESSION_STORE_MMAP_BYTES = int(os.getenv("SESSION_STORE_MMAP_BYTES", str(64 * 1024 * 1024)))
+# Expired/oversize sessions are swept at most this often
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "30"))
+
+
+def encode_turns(turns: List[Dict[str, Any]]) -> str:
+    """Serialize turns compactly (Devanagari kept as UTF-8, not \\u escapes)"""
+    return json.dumps(turns, ensure_ascii=False, separators=(",", ":"))
+
+
+class MemorySessionStore:
+    """Per-process session store: ring buffer per session, idle TTL and a byte cap"""
+
+    def __init__(self, max_turns: int = SESSION_MAX_TURNS, idle_ttl: float = SESSION_IDLE_TTL,
+                 max_bytes: int = SESSION_STORE_MAX_BYTES):
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        # session_id -> {"primary_language", "turns": deque, "last_activity", "size"}, oldest activity first
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a session's language and recent turns
+
+        Args:
+            session_id: Alexa session ID
+
+        Returns:
+            {"primary_language", "messages", "last_activity"} or None if unknown/expired
+        """
+        with self._lock:
+            data = self._sessions.get(session_id)
+            if data is None:
+                return None
+            if data["last_activity"] + self.idle_ttl < time.time():
+                self._drop(session_id)
+                return None
+            return {
+                "primary_language": data["primary_language"],
+                "messages": list(data["turns"]),
+                "last_activity": data["last_activity"],
+            }
+
+    def append_turn(self, session_id: str, turn: Dict[str, Any], primary_language: str) -> None:
+        """Record a completed turn, keeping only the last max_turns"""
+        with self._lock:
+            data = self._sessions.pop(session_id, None)
+            if data is None:
+                data = {"turns": deque(maxlen=self.max_turns), "size": 0}
+            data["turns"].append(turn)
+            data["primary_language"] = primary_language
+            data["last_activity"] = time.time()
+            size = len(encode_turns(list(data["turns"])).encode("utf-8"))
+            self._bytes += size - data["size"]
+            data["size"] = size
+            self._sessions[session_id] = data
+            self._enforce_limits()
+
+    def delete(self, session_id: str) -> bool:
+        """Release a session; returns True if it existed"""
+        with self._lock:
+            return self._drop(session_id)
+
+    def _drop(self, session_id: str) -> bool:
+        data = self._sessions.pop(session_id, None)
+        if data is None:
+            return False
+        self._bytes -= data["size"]
+        return True
+
+    def _enforce_limits(self) -> None:
+        cutoff = time.time() - self.idle_ttl
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if oldest["last_activity"] >= cutoff and self._bytes <= self.max_bytes:
+                break
+            self._drop(oldest_id)
+            self.evictions += 1
+
+    def sessions(self) -> Dict[str, Dict[str, Any]]:
+        """All live sessions (used by the /sessions debug endpoint)"""
+        with self._lock:
+            self._enforce_limits()
+            return {
+                session_id: {
+                    "primary_language": data["primary_language"],
+                    "messages": list(data["turns"]),
+                    "last_activity": data["last_activity"],
+                }
+                for session_id, data in self._sessions.items()
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "sessions": len(self._sessions),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "max_turns": self.max_turns,
+            "idle_ttl_seconds": self.idle_ttl,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteSessionStore:
+    """
+    Session store shared by all gunicorn workers through a SQLite database in WAL mode
+
+    Each session is one row holding the ring buffer of recent turns as compact
+    JSON. Writes run in an IMMEDIATE transaction so concurrent workers never
+    lose a turn; readers are never blocked by writers thanks to WAL.
+    """
+
+    def __init__(self, path: str = SESSION_STORE_PATH, max_turns: int = SESSION_MAX_TURNS,
+                 idle_ttl: float = SESSION_IDLE_TTL, max_bytes: int = SESSION_STORE_MAX_BYTES):
+        self.path = path
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        self.evictions = 0
+        # The store is built at import, in the gunicorn master under preload_app: set up the
+        # schema on a connection closed right away, so no open handle is inherited across the
+        # fork. Serving threads open their own connections lazily in _connect.
+        with closing(sqlite3.connect(self.path, timeout=5, isolation_level=None)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY,"
+                " primary_language TEXT NOT NULL,"
+                " turns TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_activity REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_activity ON sessions (last_activity)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={SESSION_STORE_MMAP_BYTES}")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a session's language and recent turns
+
+        Args:
+            session_id: Alexa session ID
+
+        Returns:
+            {"primary_language", "messages", "last_activity"} or None if unknown/expired
+        """
+        row = self._connect().execute(
+            "SELECT primary_language, turns, last_activity FROM sessions WHERE session_id = ? AND last_activity >= ?",
+            (session_id, time.time() - self.idle_ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"primary_language": row[0], "messages": json.loads(row[1]), "last_activity": row[2]}
+
+    def append_turn(self, session_id: str, turn: Dict[str, Any], primary_language: str) -> None:
+        """Record a completed turn, keeping only the last max_turns"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT turns FROM sessions WHERE session_id = ? AND last_activity >= ?",
+                (session_id, now - self.idle_ttl),
+            ).fetchone()
+            turns = json.loads(row[0]) if row else []
+            turns.append(turn)
+            encoded = encode_turns(turns[-self.max_turns:])
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, primary_language, turns, size, last_activity)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (session_id, primary_language, encoded, len(encoded.encode("utf-8")), now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if now - self._last_sweep >= SESSION_SWEEP_INTERVAL:
+            self.sweep()
+
+    def delete(self, session_id: str) -> bool:
+        """Release a session; returns True if it existed"""
+        cursor = self._connect().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def sweep(self) -> int:
+        """
+        Evict idle sessions, then the least recently active ones until under the byte cap
+
+        Returns:
+            Number of sessions evicted
+        """
+        conn = self._connect()
+        self._last_sweep = time.time()
+        evicted = conn.execute(
+            "DELETE FROM sessions WHERE last_activity < ?", (self._last_sweep - self.idle_ttl,)
+        ).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM sessions").fetchone()[0]
+        if total > self.max_bytes:
+            # Walk sessions from least to most recently active until enough bytes are freed
+            excess = total - self.max_bytes
+            doomed = []
+            for session_id, size in conn.execute("SELECT session_id, size FROM sessions ORDER BY last_activity"):
+                if excess <= 0:
+                    break
+                doomed.append((session_id,))
+                excess -= size
+            conn.executemany("DELETE FROM sessions WHERE session_id = ?", doomed)
+            evicted += len(doomed)
+        self.evictions += evicted
+        return evicted
+
+    def sessions(self) -> Dict[str, Dict[str, Any]]:
+        """All live sessions (used by the /sessions debug endpoint)"""
+        rows = self._connect().execute(
+            "SELECT session_id, primary_language, turns, last_activity FROM sessions"
+            " WHERE last_activity >= ? ORDER BY last_activity",
+            (time.time() - self.idle_ttl,),
+        ).fetchall()
+        return {
+            row[0]: {"primary_language": row[1], "messages": json.loads(row[2]), "last_activity": row[3]}
+            for row in rows
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        count, total = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions").fetchone()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "sessions": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "max_turns": self.max_turns,
+            "idle_ttl_seconds": self.idle_ttl,
+            "evictions": self.evictions,
+        }
+
+
+def create_session_store():
+    """Create the session store selected by SESSION_STORE_BACKEND"""
+    if SESSION_STORE_BACKEND == "memory":
+        return MemorySessionStore()
+    try:
+        return SQLiteSessionStore()
+    except sqlite3.Error as e:
+        logger.error(f"Could not open session database {SESSION_STORE_PATH}: {e}; using in-memory sessions")
+        return MemorySessionStore()
+
+
+session_store = create_session_store()
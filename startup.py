@@ -0,0 +1,151 @@
+"""
+Start-up work for the web workers.
+
+Two phases. prebuild() runs at import time: it exercises the code paths
+that build immutable state on first use (prompt packing, response
+rendering, templates) so that, with gunicorn's preload_app, that state is
+built once in the master and shared with the workers copy-on-write.
+Sockets do not survive a fork, so warm-up -- resolving the provider hosts
+and opening keep-alive connections to them -- runs in each worker after it
+starts. /ready reports ready only once this worker's warm-up has finished.
+"""
+import os
+import logging
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict
+from urllib.parse import urlsplit
+
+from provider_registry import registry as provider_registry
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_WARMUP = os.getenv("PROVIDER_WARMUP", "true").lower() == "true"
+# Set by gunicorn_config.py: the preloading master must not open connections,
+# each worker warms up from the post_fork hook instead
+STARTUP_DEFER_WARMUP = os.getenv("STARTUP_DEFER_WARMUP", "false").lower() == "true"
+
+_prebuild_ms: Dict[str, float] = {}
+# Warm-ups still running in this process (the ASGI lifespan adds one for the async pools)
+_warmup: Dict[str, Any] = {"pid": None, "pending": 0, "duration_ms": None, "endpoints": {}}
+_lock = threading.Lock()
+
+
+def prebuild(steps: Dict[str, Callable[[], Any]]) -> None:
+    """
+    Run start-up steps that build shared, immutable state
+
+    A failing step is logged and skipped: it only costs the first request
+    that needs it the work it would have saved.
+
+    Args:
+        steps: Step name -> zero-argument callable
+    """
+    for name, step in steps.items():
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Start-up step {name} failed: {e}")
+        _prebuild_ms[name] = round((time.perf_counter() - start) * 1000, 2)
+
+
+def resolve_host(url: str) -> bool:
+    """Resolve a provider URL's host so the first connection skips DNS (the resolver caches it)"""
+    parts = urlsplit(url)
+    if not parts.hostname:
+        return False
+    try:
+        socket.getaddrinfo(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80),
+                           type=socket.SOCK_STREAM)
+        return True
+    except OSError as e:
+        logger.warning(f"Could not resolve {parts.hostname}: {e}")
+        return False
+
+
+def _begin() -> float:
+    with _lock:
+        if _warmup["pid"] != os.getpid():
+            _warmup.update(pid=os.getpid(), pending=0, duration_ms=None, endpoints={})
+        _warmup["pending"] += 1
+    return time.perf_counter()
+
+
+def _finish(start: float, results: Dict[str, Dict[str, bool]]) -> None:
+    with _lock:
+        _warmup["pending"] -= 1
+        _warmup["endpoints"].update(results)
+        _warmup["duration_ms"] = max(_warmup["duration_ms"] or 0.0, round((time.perf_counter() - start) * 1000, 1))
+    if is_ready():
+        logger.info(f"Worker {os.getpid()} ready after {_warmup['duration_ms']}ms warm-up")
+
+
+def _connect_all(start: float) -> None:
+    results = {}
+    try:
+        if PROVIDER_WARMUP:
+            for endpoint in provider_registry.endpoints():
+                resolved = resolve_host(endpoint.url)
+                results[endpoint.name] = {
+                    "resolved": resolved,
+                    "connected": endpoint.client.warm() if resolved else False,
+                }
+    finally:
+        _finish(start, results)
+
+
+def warm_up() -> None:
+    """
+    Resolve and connect to every configured provider endpoint
+
+    Unreachable providers do not keep the worker out of rotation; their
+    circuit breakers deal with them once traffic arrives.
+    """
+    _connect_all(_begin())
+
+
+def start_warm_up() -> threading.Thread:
+    """Warm up on a daemon thread so the worker starts accepting requests straight away"""
+    # Counted as pending before the thread starts, so /ready cannot report ready in between
+    thread = threading.Thread(target=_connect_all, args=(_begin(),), name="startup-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+async def warm_up_async() -> None:
+    """Asyncio counterpart of warm_up for the ASGI lifespan, warming the non-blocking pools"""
+    start = _begin()
+    results = {}
+    try:
+        if PROVIDER_WARMUP:
+            for endpoint in provider_registry.endpoints():
+                results[endpoint.name] = {"resolved": True, "connected": await endpoint.async_client.warm()}
+    finally:
+        _finish(start, results)
+
+
+def is_ready() -> bool:
+    """True once this process (not a parent it was forked from) has finished warming up"""
+    return _warmup["pid"] == os.getpid() and _warmup["pending"] == 0
+
+
+def readiness() -> Dict[str, Any]:
+    """
+    Describe this worker's start-up state for /ready
+
+    Returns:
+        Dictionary with the ready flag, warm-up results and prebuild timings
+    """
+    ready = is_ready()
+    return {
+        "status": "ready" if ready else "starting",
+        "pid": os.getpid(),
+        "warmup": {
+            "done": ready,
+            "duration_ms": _warmup["duration_ms"] if ready else None,
+            "endpoints": _warmup["endpoints"] if ready else {},
+        },
+        "prebuild_ms": dict(_prebuild_ms),
+    }
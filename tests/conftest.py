@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+
+# Read at import time by the app modules: no network at start-up, a throwaway session store
+os.environ.setdefault("STARTUP_DEFER_WARMUP", "true")
+os.environ.setdefault("PROVIDER_WARMUP", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("SESSION_STORE_PATH", os.path.join(tempfile.mkdtemp(prefix="alexa-tests-"), "sessions.db"))
+
+from mock_provider import MockProviderHandler, MockProviderServer  # noqa: E402
+
+
+@pytest.fixture
+def mock_provider():
+    """Start benchmarks/mock_provider.py in-process; call with handler attributes, get its base URL"""
+    servers = []
+
+    def start(**attributes):
+        attributes.setdefault("token_delay", 0)
+        attributes.setdefault("stats", {"openai": 0, "huggingface": 0, "errors": 0, "streams": 0,
+                                        "streams_cut_off": 0})
+        handler = type("Handler", (MockProviderHandler,), attributes)
+        server = MockProviderServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
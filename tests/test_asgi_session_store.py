@@ -0,0 +1,33 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+asgi = pytest.importorskip("asgi")
+from session_store import SQLiteSessionStore, session_store  # noqa: E402
+
+
+@pytest.mark.skipif(not isinstance(session_store, SQLiteSessionStore), reason="needs the SQLite session store")
+def test_locked_session_store_does_not_stall_the_event_loop():
+    # Another worker holding the write lock makes the store wait on its busy timeout
+    locker = sqlite3.connect(session_store.path, isolation_level=None, check_same_thread=False)
+    locker.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.5, locker.rollback).start()
+    payload = {"request": {"type": "SessionEndedRequest"}, "session": {"sessionId": "locked"}}
+
+    async def run():
+        ticks = 0
+        turn = asyncio.ensure_future(asgi.handle_alexa(payload))
+        while not turn.done():
+            await asyncio.sleep(0.01)
+            ticks += 1
+        return ticks, turn.result()
+
+    try:
+        ticks, reply = asyncio.run(run())
+    finally:
+        locker.close()
+    assert reply == (None, "en", True)
+    # The loop kept running while the delete waited for the lock
+    assert ticks >= 20
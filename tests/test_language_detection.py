@@ -0,0 +1,26 @@
+import pytest
+
+from bench_language_detection import evaluate, load_corpus
+from language_utils import detect_language, score_transliteration, script_language
+
+
+def test_corpus_accuracy():
+    assert evaluate(detect_language, load_corpus()) == 1.0
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("kya haal hai?", {"hi": 2.0}),
+    ("Namaste! (kaise)", {"hi": 2.0}),
+    ("main street", {"hi": 0.3}),
+    ("kyaaa kya_ kya1 kya-baat", {"hi": 1.0}),
+    ("I maintain the chair", {}),
+    ("", {}),
+])
+def test_transliteration_scores_whole_words(text, expected):
+    assert score_transliteration(text) == expected
+
+
+def test_script_language_counts_mixed_scripts():
+    assert script_language("hello") is None
+    assert script_language("नमस्ते") == "hi"
+    assert script_language("नमस्ते வணக்கம்") == "ta"
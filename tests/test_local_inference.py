@@ -0,0 +1,156 @@
+import mmap
+import os
+import time
+
+import pytest
+
+from language_utils import get_voice_length_limit
+from local_inference import (
+    BUNDLED_MODEL_PATH, LOCAL_MODEL_MIN_TIME, BigramModel, LlamaCppModel, LocalModel, start_token,
+)
+from provider_scheduler import Deadline
+
+QUESTIONS = {
+    "en": "What is a black hole?",
+    "hi": "पानी किससे बना है?",
+}
+
+
+def messages_for(question):
+    return [{"role": "user", "content": question}]
+
+
+@pytest.fixture(scope="module")
+def bigram():
+    return LocalModel("bigram", BUNDLED_MODEL_PATH)
+
+
+def test_bundled_model_is_memory_mapped():
+    model = BigramModel(BUNDLED_MODEL_PATH)
+    assert isinstance(model._mm, mmap.mmap)
+    assert model.size == os.path.getsize(BUNDLED_MODEL_PATH)
+    for language in QUESTIONS:
+        word_id = model.lookup(start_token(language))
+        assert word_id is not None
+        assert model.word(word_id) == start_token(language)
+        assert model.successors(word_id)
+    assert model.lookup("no-such-word-in-the-model") is None
+
+
+def test_local_model_loads_in_this_process(bigram):
+    assert bigram.enabled
+    stats = bigram.stats()
+    assert stats["loaded_by_pid"] == os.getpid()
+    assert stats["size_bytes"] == os.path.getsize(BUNDLED_MODEL_PATH)
+
+
+@pytest.mark.parametrize("language", sorted(QUESTIONS))
+def test_reply_fits_the_voice_limit(bigram, language):
+    reply = bigram.generate(messages_for(QUESTIONS[language]), language, Deadline(5))
+    assert reply
+    assert len(reply) <= get_voice_length_limit(language)
+
+
+@pytest.mark.parametrize("language", sorted(QUESTIONS))
+def test_generation_respects_max_chars(bigram, language):
+    text = bigram.model.generate(messages_for(QUESTIONS[language]), language, 20, time.monotonic() + 5)
+    assert 0 < len(text) <= 20
+
+
+def test_generation_stops_at_the_deadline(bigram):
+    text = bigram.model.generate(messages_for(QUESTIONS["en"]), "en", 300, time.monotonic())
+    assert text == ""
+
+
+class EndlessLlama:
+    """Stands in for llama_cpp.Llama: streams one token per call, forever"""
+
+    def __init__(self):
+        self.closed = False
+
+    def create_chat_completion(self, messages, max_tokens, temperature, stream):
+        assert stream
+
+        def chunks():
+            try:
+                while True:
+                    time.sleep(0.001)
+                    yield {"choices": [{"delta": {"content": "word "}}]}
+            finally:
+                self.closed = True
+
+        return chunks()
+
+
+def test_llama_cpp_generation_stops_at_the_deadline():
+    model = LlamaCppModel.__new__(LlamaCppModel)
+    model._llama = EndlessLlama()
+    start = time.monotonic()
+    text = model.generate(messages_for(QUESTIONS["en"]), "en", 10_000, start + 0.1)
+    assert text
+    assert time.monotonic() - start < 1
+    assert model._llama.closed
+
+
+def test_llama_cpp_generation_stops_at_max_chars():
+    model = LlamaCppModel.__new__(LlamaCppModel)
+    model._llama = EndlessLlama()
+    text = model.generate(messages_for(QUESTIONS["en"]), "en", 50, time.monotonic() + 30)
+    assert 50 <= len(text) < 50 + len("word ")
+    assert model._llama.closed
+
+
+def test_too_little_time_left_skips_the_model(bigram):
+    generations = bigram.generations
+    deadline = Deadline(LOCAL_MODEL_MIN_TIME / 2)
+    assert bigram.submit(messages_for(QUESTIONS["en"]), "en", deadline) is None
+    assert bigram.generate(messages_for(QUESTIONS["en"]), "en", deadline) is None
+    assert bigram.generations == generations
+
+
+@pytest.fixture
+def fallback_chain(monkeypatch):
+    """Run query_ai_api with the provider race stubbed; returns the query, the reply and the tiers called"""
+    import app
+
+    def run(provider_reply, local_model):
+        calls = []
+
+        def race_providers(chain, messages, deadline):
+            calls.append("providers")
+            return provider_reply
+
+        def local_generate(messages, language, deadline):
+            calls.append("local")
+            return generate(messages, language, deadline)
+
+        generate = local_model.generate
+        monkeypatch.setattr(app.provider_scheduler, "race_providers", race_providers)
+        monkeypatch.setattr(local_model, "generate", local_generate)
+        monkeypatch.setattr(app, "local_model", local_model)
+        # A question no other test asks, so the response cache never answers it
+        query = f"Tell me about fallback order {time.monotonic_ns()}"
+        reply = app.query_ai_api(messages_for(query), query, "en", Deadline(5))
+        return query, reply, calls
+
+    return run
+
+
+def test_providers_answer_first(fallback_chain, bigram):
+    _, reply, calls = fallback_chain("From the provider.", bigram)
+    assert reply == "From the provider."
+    assert calls == ["providers"]
+
+
+def test_local_model_answers_when_providers_fail(fallback_chain, bigram):
+    _, reply, calls = fallback_chain(None, bigram)
+    assert reply
+    assert calls == ["providers", "local"]
+
+
+def test_canned_reply_when_the_local_model_is_off(fallback_chain):
+    import app
+
+    query, reply, calls = fallback_chain(None, LocalModel(""))
+    assert calls == ["providers", "local"]
+    assert reply == app.get_fallback_response(query, "en")
@@ -0,0 +1,17 @@
+import metrics
+
+
+def test_store_events_are_exported_as_counters():
+    import app
+
+    body = app.app.test_client().get("/metrics").get_data(as_text=True)
+    assert "# TYPE alexa_session_evictions_total counter" in body
+    assert "# TYPE alexa_response_cache_events_total counter" in body
+    assert 'alexa_response_cache_events_total{event="hits"}' in body
+
+
+def test_advance_to_never_moves_a_counter_backwards():
+    counter = metrics.Counter("test_events_total", "Test events", ["event"])
+    counter.advance_to("hits", total=5)
+    counter.advance_to("hits", total=3)
+    assert counter.samples() == ['test_events_total{event="hits"} 5']
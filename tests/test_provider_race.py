@@ -0,0 +1,93 @@
+import threading
+
+import provider_scheduler
+from provider_scheduler import Deadline
+
+
+def test_losing_stream_stops_when_the_race_is_won(monkeypatch, mock_provider):
+    import app
+    from provider_registry import Endpoint
+
+    monkeypatch.setattr(provider_scheduler, "HEDGE_DEFAULT_DELAY", 0.05)
+    monkeypatch.setattr(provider_scheduler, "HEDGE_MIN_DELAY", 0.05)
+    # No sentence ends, so only cancellation stops this stream before its 10 seconds are up
+    url = mock_provider(reply=" ".join(["word"] * 200), token_delay=0.05)
+    endpoint = Endpoint("openai", "openai-race-test", f"{url}/v1/chat/completions", "test")
+    stream_done = threading.Event()
+    stream_result = []
+
+    def slow_stream(messages, timeout):
+        try:
+            stream_result.append(app.query_openai_api_stream(messages, timeout, endpoint=endpoint))
+        finally:
+            stream_done.set()
+
+    def fast(messages, timeout):
+        return "From the hedge."
+
+    messages = [{"role": "user", "content": "hello"}]
+    reply = provider_scheduler.race_providers([("slow-stream", slow_stream), ("fast", fast)], messages, Deadline(5))
+    assert reply == "From the hedge."
+    assert stream_done.wait(1)
+    assert stream_result == [None]
+
+
+def test_call_cancelled_outside_a_race():
+    assert not provider_scheduler.call_cancelled()
+
+
+def test_losing_blocking_calls_are_counted_until_they_finish(monkeypatch):
+    from admission import AdmissionController
+
+    monkeypatch.setattr(provider_scheduler, "HEDGE_DEFAULT_DELAY", 0.05)
+    monkeypatch.setattr(provider_scheduler, "HEDGE_MIN_DELAY", 0.05)
+    loser_release = threading.Event()
+    loser_done = threading.Event()
+
+    def blocking(messages, timeout):
+        loser_release.wait(5)
+        loser_done.set()
+        return None
+
+    def fast(messages, timeout):
+        return "From the hedge."
+
+    before = provider_scheduler.lingering_calls()
+    reply = provider_scheduler.race_providers([("blocking", blocking), ("fast", fast)], [], Deadline(5))
+    assert reply == "From the hedge."
+    assert AdmissionController().stats()["lingering_calls"] == before + 1
+    loser_release.set()
+    assert loser_done.wait(1)
+    # The done callback runs on the pool thread right after the call returns
+    for _ in range(100):
+        if provider_scheduler.lingering_calls() == before:
+            break
+        loser_done.wait(0.01)
+    assert provider_scheduler.lingering_calls() == before
+
+
+def test_configure_executor_sizes_the_pool(monkeypatch):
+    # Restored afterwards: app.py sizes the real pool at import
+    monkeypatch.setattr(provider_scheduler, "_executor", provider_scheduler._executor)
+    assert provider_scheduler.configure_executor(12) == 12
+    assert provider_scheduler._executor._max_workers == 12
+    monkeypatch.setattr(provider_scheduler, "SCHEDULER_MAX_WORKERS", 5)
+    assert provider_scheduler.configure_executor(12) == 5
+
+
+def test_blocking_calls_with_a_hedge_behind_them_get_a_short_timeout(monkeypatch):
+    monkeypatch.setattr(provider_scheduler, "HEDGE_DEFAULT_DELAY", 0.05)
+    monkeypatch.setattr(provider_scheduler, "HEDGE_MIN_DELAY", 0.05)
+    monkeypatch.setattr(provider_scheduler, "HEDGE_TIMEOUT_MARGIN", 0.1)
+    timeouts = {}
+
+    def no_answer(name):
+        def call(messages, timeout):
+            timeouts[name] = timeout
+            return None
+        return call
+
+    chain = [("first", no_answer("first")), ("second", no_answer("second")), ("last", no_answer("last"))]
+    assert provider_scheduler.race_providers(chain, [], Deadline(5)) is None
+    assert timeouts["first"] == timeouts["second"] == 0.05 + 0.1
+    assert 4 < timeouts["last"] <= 5
@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+from session_store import SQLiteSessionStore
+
+
+def test_sqlite_store_holds_no_connection_until_used():
+    # Built in the gunicorn master under preload_app; an open handle would cross the fork
+    path = os.path.join(tempfile.mkdtemp(prefix="alexa-tests-"), "sessions.db")
+    store = SQLiteSessionStore(path)
+    assert getattr(store._local, "conn", None) is None
+    store.append_turn("session", {"user": "hello", "assistant": "hi"}, "en")
+    assert store.get("session")["messages"] == [{"user": "hello", "assistant": "hi"}]
+    assert store._local.pid == os.getpid()
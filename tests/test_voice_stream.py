@@ -0,0 +1,83 @@
+import itertools
+
+import pytest
+
+from language_utils import VoiceStreamAccumulator, get_voice_length_limit
+
+_names = itertools.count()
+
+
+def test_overflowing_first_sentence_is_hard_truncated():
+    accumulator = VoiceStreamAccumulator("en")
+    assert not accumulator.feed("A" * 290)
+    assert accumulator.feed("bcdefghijklmnop. Short tail here.")
+    text = accumulator.text()
+    assert text.startswith("A" * 290)
+    assert "Short tail" not in text
+    assert len(text) <= get_voice_length_limit("en") + len("...")
+
+
+def test_complete_sentences_stop_at_the_limit():
+    accumulator = VoiceStreamAccumulator("en")
+    sentence = "Every sentence here has the same length. "
+    full = False
+    for _ in range(20):
+        full = accumulator.feed(sentence)
+        if full:
+            break
+    assert full
+    fitting = get_voice_length_limit("en") // len(sentence.strip())
+    assert accumulator.text() == (sentence * fitting).strip()
+
+
+def test_unterminated_tail_is_kept_when_the_stream_ends():
+    accumulator = VoiceStreamAccumulator("en")
+    accumulator.feed("First sentence. And a tail")
+    assert accumulator.text() == "First sentence. And a tail"
+
+
+@pytest.fixture
+def stream(mock_provider):
+    """Stream a completion from the mock provider through query_openai_api_stream"""
+    import app
+    from provider_registry import Endpoint
+
+    def run(reply, language="en", **attributes):
+        url = mock_provider(reply=reply, **attributes)
+        endpoint = Endpoint("openai", f"openai-test-{next(_names)}", f"{url}/v1/chat/completions", "test")
+        messages = [{"role": "user", "content": "hello"}]
+        return app.query_openai_api_stream(messages, timeout=5, language=language, endpoint=endpoint)
+
+    return run
+
+
+def test_stream_of_one_large_delta(stream):
+    # The mock sends one event per space-separated word, so this arrives as a single delta
+    reply = "x" * 400 + "."
+    text = stream(reply)
+    assert text == "x" * get_voice_length_limit("en") + "..."
+
+
+def test_stream_of_many_small_deltas(stream):
+    reply = " ".join(["Short sentence number one."] * 30)
+    text = stream(reply)
+    assert text.startswith("Short sentence number one.")
+    assert len(text) <= get_voice_length_limit("en")
+    assert text.endswith(".")
+
+
+def test_stream_without_done_keeps_the_whole_reply(stream):
+    text = stream("A complete answer. With an unterminated tail", send_done=False)
+    assert text == "A complete answer. With an unterminated tail"
+
+
+def test_stream_stops_at_done(stream):
+    text = stream("Just one sentence.")
+    assert text == "Just one sentence."
+
+
+def test_hindi_stream_uses_the_hindi_limit(stream):
+    reply = " ".join(["यह एक छोटा वाक्य है।"] * 40)
+    text = stream(reply, language="hi")
+    assert 0 < len(text) <= get_voice_length_limit("hi")
+    assert text.endswith("।")